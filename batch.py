@@ -0,0 +1,266 @@
+# batch.py Rules evaluated on many boards at once with NumPy
+
+'''
+A Batch holds N positions of the same game as NumPy arrays and evaluates
+the rules of env.py on all of them together:
+    tableau      (N, columns, depth) card in each slot, bottom card first, EMPTY above the top
+    heights      (N, columns)        number of cards in each tableau pile
+    cells        (N, cells)          card in each free cell, or EMPTY
+    foundations  (N, 4)              number of cards on each foundation, in the order of SUIT_NAMES
+Cards are numbered as in env.py.  Actions and move counts are the same as
+in env.py, so a Batch can be checked against FreecellEnv.
+'''
+import numpy as np
+import env
+from variants import RULES
+
+EMPTY = 52           # card number of an empty slot
+
+# tables indexed by card number, with an entry for EMPTY
+RANK = np.array(env.RANK + (0,), dtype=np.int16)
+SUIT = np.array(env.SUIT + (4,), dtype=np.int16)
+
+class Tables:
+    '''
+    The lookup tables of a game's Rules as NumPy arrays
+    '''
+    def __init__(self, rules):
+        self.follows = np.zeros((EMPTY+1, EMPTY+1), dtype=bool)
+        self.follows[:52, :52] = np.array([list(row) for row in rules.follows], dtype=bool)
+        self.emptyOK = np.zeros(EMPTY+1, dtype=bool)
+        self.emptyOK[:52] = list(rules.emptyOK)
+        self.autoNeeds = np.zeros((EMPTY+1, 4), dtype=bool)
+        for card, needs in enumerate(rules.autoNeeds):
+            self.autoNeeds[card, list(needs)] = True
+        self.supermove = np.array(rules.supermove, dtype=np.int32)
+        # 7 dealt cards and a run from King to Ace in freecell
+        self.depth = -(-(52-rules.dealtCells)//rules.columns) + 13
+
+TABLES = [Tables(rules) for rules in RULES]
+
+class Batch:
+    def __init__(self, n, game):
+        self.game = game
+        self.rules = rules = RULES[game]
+        self.tables = tables = TABLES[game]
+        self.tableau = np.full((n, rules.columns, tables.depth), EMPTY, dtype=np.uint8)
+        self.heights = np.zeros((n, rules.columns), dtype=np.int16)
+        self.cells = np.full((n, rules.cells), EMPTY, dtype=np.uint8)
+        self.foundations = np.zeros((n, 4), dtype=np.int16)
+
+    def __len__(self):
+        return len(self.heights)
+
+    @classmethod
+    def fromPositions(cls, positions, game):
+        batch = cls(len(positions), game)
+        for i, position in enumerate(positions):
+            batch.setPosition(i, position)
+        return batch
+
+    @classmethod
+    def fromDecks(cls, decks, game):
+        return cls.fromPositions([env.dealPosition(deck, game) for deck in decks], game)
+
+    def setPosition(self, i, position):
+        rules = self.rules
+        self.tableau[i] = EMPTY
+        self.cells[i] = EMPTY
+        for k in range(rules.columns):
+            pile = position[k]
+            self.tableau[i, k, :len(pile)] = pile
+            self.heights[i, k] = len(pile)
+        for k in range(rules.cells):
+            if position[rules.cellBase+k]:
+                self.cells[i, k] = position[rules.cellBase+k][-1]
+        for k in range(4):
+            self.foundations[i, k] = len(position[rules.foundationBase+k])
+
+    def position(self, i):
+        tableau = tuple(tuple(int(c) for c in self.tableau[i, k, :self.heights[i, k]])
+                        for k in range(self.rules.columns))
+        cells = tuple(() if c == EMPTY else (int(c),) for c in self.cells[i])
+        foundations = tuple(tuple(4*r+k for r in range(self.foundations[i, k]))
+                            for k in range(4))
+        return tableau + cells + foundations
+
+    def positions(self):
+        return [self.position(i) for i in range(len(self))]
+
+    def tops(self):
+        '''
+        Top card of each tableau pile, (N, columns)
+        '''
+        idx = np.maximum(self.heights-1, 0)[:, :, None]
+        top = np.take_along_axis(self.tableau, idx, axis=2)[:, :, 0]
+        return np.where(self.heights > 0, top, EMPTY)
+
+    def runLengths(self):
+        '''
+        Number of cards that can be selected together at the top of each
+        tableau pile, (N, columns)
+        '''
+        t = self.tableau
+        linked = self.tables.follows[t[:, :, 1:], t[:, :, :-1]]     # slot j+1 follows slot j
+        slots = np.arange(t.shape[2]-1)
+        h = self.heights[:, :, None]
+        breaks = ~linked & (slots < h-1)
+        lastBreak = np.where(breaks, slots, -1).max(axis=2)
+        return np.where(self.heights > 0, self.heights-1-lastBreak, 0)
+
+    def supermoveLimit(self, toEmpty=False):
+        '''
+        Number of cards that can be moved to a tableau pile, (N,)
+        '''
+        freeCells = (self.cells == EMPTY).sum(axis=1)
+        freeTableau = (self.heights == 0).sum(axis=1)
+        if toEmpty:
+            freeTableau = np.maximum(freeTableau-1, 0)
+        return self.tables.supermove[freeCells, freeTableau]
+
+    def moveCounts(self):
+        '''
+        The number of cards moved by each action, 0 if illegal, (N, rules.nactions)
+        '''
+        n = len(self)
+        rules = self.rules
+        tables = self.tables
+        columns, cellBase, base = rules.columns, rules.cellBase, rules.foundationBase
+        depth = self.tableau.shape[2]
+        tabTops = self.tops()
+        # the sources:  tableau piles then cells
+        srcPiles = np.concatenate([self.tableau,
+                                   np.full((n, rules.cells, depth), EMPTY, dtype=np.uint8)], axis=1)
+        srcPiles[:, cellBase:, 0] = self.cells
+        occupied = self.cells != EMPTY
+        h = np.concatenate([self.heights, occupied], axis=1)
+        run = np.concatenate([self.runLengths(), occupied], axis=1)
+        top = np.concatenate([tabTops, self.cells], axis=1)
+        counts = np.zeros((n, base, rules.npiles), dtype=np.int16)
+
+        # foundations
+        suit, rank = SUIT[top], RANK[top]
+        played = np.take_along_axis(self.foundations, np.minimum(suit, 3), axis=1)
+        ok = (top != EMPTY) & (rank == played+1)
+        counts[:, :, base:][ok[:, :, None] & (suit[:, :, None] == np.arange(4))] = 1
+
+        # free cells
+        ok = (top != EMPTY)[:, :, None] & ~occupied[:, None, :]
+        counts[:, :, cellBase:base][ok] = 1
+
+        # nonempty tableau piles
+        limit = np.minimum(run, self.supermoveLimit()[:, None])
+        upper = tabTops[:, None, :]
+        below = RANK[upper] - rank[:, :, None]
+        idx = np.clip(h[:, :, None]-below, 0, depth-1)
+        lower = np.take_along_axis(srcPiles, idx, axis=2)
+        ok = ((upper != EMPTY) & (below >= 1) & (below <= limit[:, :, None])
+              & tables.follows[lower, upper])
+        counts[:, :, :columns][ok] = below[ok]
+
+        # empty tableau piles take the longest movable run whose bottom card may start a pile
+        limit = np.minimum(run, self.supermoveLimit(True)[:, None])
+        slots = np.arange(depth)
+        hh = h[:, :, None]
+        starts = tables.emptyOK[srcPiles] & (slots >= hh-limit[:, :, None]) & (slots < hh)
+        lowest = np.where(starts, slots, depth).min(axis=2)
+        limit = np.where(lowest < depth, h-lowest, 0)
+        empty = (self.heights == 0)[:, None, :]
+        counts[:, :, :columns] = np.where(empty, limit[:, :, None], counts[:, :, :columns])
+
+        src = np.arange(base)
+        counts[:, src, src] = 0
+        return counts.reshape(n, rules.nactions)
+
+    def legalMask(self):
+        return self.moveCounts() > 0
+
+    def applyMoves(self, sources, targets, counts):
+        '''
+        Move counts[i] cards from sources[i] to targets[i] on board i.
+        Boards with a count of 0 are unchanged.
+        '''
+        rules = self.rules
+        columns, cellBase, base = rules.columns, rules.cellBase, rules.foundationBase
+        last = columns-1
+        depth = self.tableau.shape[2]
+        sources = np.asarray(sources)
+        targets = np.asarray(targets)
+        counts = np.asarray(counts)
+        live = counts > 0
+        rows = np.nonzero(live)[0]
+        s, t, m = sources[live], targets[live], counts[live]
+        fromTab = s < columns
+        toTab = t < columns
+        toCell = (t >= cellBase) & (t < base)
+        toFnd = t >= base
+        hs = np.where(fromTab, self.heights[rows, np.minimum(s, last)], 1)
+        ht = np.where(toTab, self.heights[rows, np.minimum(t, last)], 0)
+        for k in range(int(m.max()) if len(m) else 0):
+            moving = m > k
+            slot = hs-m+k
+            card = np.where(fromTab,
+                            self.tableau[rows, np.minimum(s, last), np.clip(slot, 0, depth-1)],
+                            self.cells[rows, np.clip(s-cellBase, 0, rules.cells-1)])
+            sel = moving & toTab
+            self.tableau[rows[sel], t[sel], ht[sel]+k] = card[sel]
+            sel = moving & toCell
+            self.cells[rows[sel], t[sel]-cellBase] = card[sel]
+            sel = moving & fromTab
+            self.tableau[rows[sel], s[sel], slot[sel]] = EMPTY
+        self.foundations[rows[toFnd], t[toFnd]-base] += 1
+        sel = ~fromTab
+        self.cells[rows[sel], s[sel]-cellBase] = EMPTY
+        self.heights[rows[fromTab], s[fromTab]] -= m[fromTab]
+        self.heights[rows[toTab], t[toTab]] += m[toTab]
+
+    def autoMoves(self):
+        '''
+        The source of the card each board would play to the foundations
+        automatically, or -1, (N,)
+        '''
+        top = np.concatenate([self.tops(), self.cells], axis=1)
+        rank, suit = RANK[top], SUIT[top]
+        played = np.take_along_axis(self.foundations, np.minimum(suit, 3), axis=1)
+        nextCard = (top != EMPTY) & (played == rank-1)
+        covered = self.foundations[:, None, :] >= (rank-1)[:, :, None]
+        safe = nextCard & (covered | ~self.tables.autoNeeds[top]).all(axis=2)
+        return np.where(safe.any(axis=1), safe.argmax(axis=1), -1)
+
+    def autoplay(self):
+        '''
+        Make all automatic moves on every board.
+        Return the number of cards played on each board.
+        '''
+        played = np.zeros(len(self), dtype=np.int16)
+        sources = self.autoMoves()
+        while (sources >= 0).any():
+            live = sources >= 0
+            top = np.concatenate([self.tops(), self.cells], axis=1)
+            card = top[np.arange(len(self)), np.maximum(sources, 0)]
+            self.applyMoves(sources, self.rules.foundationBase+SUIT[card], live.astype(np.int16))
+            played += live
+            sources = self.autoMoves()
+        return played
+
+    def won(self):
+        return (self.foundations == 13).all(axis=1)
+
+    def step(self, actions):
+        '''
+        Make one action on each board, -1 for none, then the automatic moves.
+        Return the rewards and done flags, as FreecellEnv.step does.
+        '''
+        actions = np.asarray(actions)
+        counts = self.moveCounts()
+        act = np.maximum(actions, 0)
+        n = np.where(actions >= 0, counts[np.arange(len(self)), act], 0)
+        if ((actions >= 0) & (n == 0)).any():
+            raise ValueError('illegal action')
+        sources, targets = np.divmod(act, self.rules.npiles)
+        before = self.foundations.sum(axis=1)
+        self.applyMoves(sources, targets, n)
+        self.autoplay()
+        rewards = self.foundations.sum(axis=1) - before
+        done = self.won() | ~self.legalMask().any(axis=1)
+        return rewards, done
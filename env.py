@@ -0,0 +1,281 @@
+# env.py Simulation environment for freecell solitaire and related games
+
+'''
+A lightweight, side-effect free version of the rules in model.py, for
+programs that play many games, such as move-selection policies.
+
+A card is an integer 0 to 51:  rank = card//4 + 1 and suit = SUIT_NAMES[card%4].
+A position is a tuple of piles, numbered as in the Model.  In freecell
+    -- tableau piles are numbered 0 to 7,
+    -- free cells are numbered 8 to 11,
+    -- and foundations 12 to 15 (in the order of SUIT_NAMES),
+and in general the layout is given by the game's Rules in variants.py.
+Each pile is a tuple of cards, bottom card first.  Positions are immutable, so
+cloning a position or an environment copies a reference, and a move builds
+new tuples only for the two piles it changes.
+
+An action is the integer source*rules.npiles + target, for a source that is a
+tableau pile or a cell, and any target (source*16 + target in freecell).
+The number of cards moved is not part of the action:  a move to a nonempty
+tableau pile can only move one number of cards, and a move to an empty
+tableau pile moves as many cards as the rules allow.
+'''
+import random
+from variants import RULES, RANK, SUIT_OF as SUIT, SUIT_NAMES, RANK_NAMES, FREECELL
+
+CODES = tuple(RANK_NAMES[RANK[c]]+SUIT_NAMES[SUIT[c]] for c in range(52))
+CARD = {code:c for c, code in enumerate(CODES)}
+
+def fromModel(model):
+    '''
+    The position of a Model
+    '''
+    return tuple(tuple(c.index for c in pile) for pile in model.piles)
+
+def dealPosition(deck, game=FREECELL):
+    '''
+    Deal a sequence of 52 cards as Model.deal does.
+    The cards may be integers or codes such as 'AS'.
+    '''
+    rules = RULES[game]
+    deck = [CARD[c] if isinstance(c, str) else c for c in deck]
+    dealt = 52 - rules.dealtCells
+    columns = rules.columns
+    tableau = tuple(tuple(deck[k:dealt:columns]) for k in range(columns))
+    cells = tuple((c,) for c in deck[dealt:]) + ((),)*(rules.cells-rules.dealtCells)
+    return tableau + cells + ((),)*4
+
+def follows(lower, upper, game):
+    '''
+    Can card lower be placed on card upper in the tableau?
+    '''
+    return RULES[game].follows[lower][upper] == 1
+
+def runLength(pile, game):
+    '''
+    Number of cards at the top of a tableau pile that can be selected together
+    '''
+    follows = RULES[game].follows
+    n = len(pile)
+    if n == 0:
+        return 0
+    k = n-1
+    while k > 0 and follows[pile[k]][pile[k-1]]:
+        k -= 1
+    return n-k
+
+def maxMove(position, game, target):
+    '''
+    Largest number of cards that can be moved to tableau pile target
+    '''
+    rules = RULES[game]
+    freeCells = sum(1 for k in range(rules.cellBase, rules.foundationBase) if not position[k])
+    freeTableau = sum(1 for k in range(rules.columns) if not position[k])
+    if not position[target]:
+        freeTableau -= 1
+    return rules.supermove[freeCells][freeTableau]
+
+def moveCount(position, game, source, target, run=None):
+    '''
+    The number of cards moved by the action (source, target), or 0 if the
+    action is illegal.  run is the runLength of the source, if known.
+    '''
+    if source == target:
+        return 0
+    pile = position[source]
+    if not pile:
+        return 0
+    rules = RULES[game]
+    dest = position[target]
+    if target >= rules.foundationBase:
+        card = pile[-1]
+        if SUIT[card] != target-rules.foundationBase:
+            return 0
+        return 1 if RANK[card] == len(dest)+1 else 0
+    if target >= rules.cellBase:
+        return 0 if dest else 1
+    if source >= rules.cellBase:
+        run = 1
+    elif run is None:
+        run = runLength(pile, game)
+    limit = min(run, maxMove(position, game, target))
+    if not dest:
+        emptyOK = rules.emptyOK
+        for n in range(limit, 0, -1):
+            if emptyOK[pile[-n]]:
+                return n
+        return 0
+    upper = dest[-1]
+    n = RANK[upper] - RANK[pile[-1]]
+    if n < 1 or n > limit:
+        return 0
+    return n if rules.follows[pile[-n]][upper] else 0
+
+def legalMask(position, game):
+    '''
+    A bytearray of length rules.nactions with 1 for each legal action
+    '''
+    rules = RULES[game]
+    npiles = rules.npiles
+    mask = bytearray(rules.nactions)
+    for source in range(rules.foundationBase):
+        pile = position[source]
+        if not pile:
+            continue
+        run = runLength(pile, game) if source < rules.cellBase else 1
+        base = source*npiles
+        for target in range(npiles):
+            if moveCount(position, game, source, target, run):
+                mask[base+target] = 1
+    return mask
+
+def legalActions(position, game):
+    return [a for a, legal in enumerate(legalMask(position, game)) if legal]
+
+def move(position, source, target, n):
+    '''
+    The position after moving n cards from source to target
+    '''
+    piles = list(position)
+    pile = position[source]
+    piles[target] = position[target] + pile[-n:]
+    piles[source] = pile[:-n]
+    return tuple(piles)
+
+def autoMove(position, game):
+    '''
+    The (source, target) of the card Model.automaticMove would play to
+    the foundations, or None
+    '''
+    rules = RULES[game]
+    base = rules.foundationBase
+    autoNeeds = rules.autoNeeds
+    for idx in range(base):
+        pile = position[idx]
+        if not pile:
+            continue
+        card = pile[-1]
+        below = RANK[card]-1
+        target = base+SUIT[card]
+        if len(position[target]) != below:
+            continue
+        if all(len(position[base+k]) >= below for k in autoNeeds[card]):
+            return idx, target
+    return None
+
+def autoplay(position, game):
+    '''
+    Make all automatic moves.  Return the new position and the number of
+    cards played to the foundations.
+    '''
+    count = 0
+    auto = autoMove(position, game)
+    while auto is not None:
+        position = move(position, auto[0], auto[1], 1)
+        count += 1
+        auto = autoMove(position, game)
+    return position, count
+
+def won(position):
+    return all(len(pile) == 13 for pile in position[-4:])
+
+class FreecellEnv:
+    '''
+    reset(deal) starts a game, and step(action) returns (state, reward, done),
+    where the state is the position, the reward is the number of cards
+    played to the foundations, and the game is done when it is won or there
+    are no legal moves.  Automatic moves are made after every step, but not
+    after the deal, just as in the Model.
+    '''
+    def __init__(self, game=FREECELL, seed=None):
+        self.game = game
+        self.random = random.Random(seed)
+        self.state = None
+        self.mask = None
+        self.done = False
+
+    def reset(self, deal=None):
+        '''
+        deal is a sequence of 52 cards, or an integer seed, or None for a
+        random deal.
+        '''
+        if deal is None or isinstance(deal, int):
+            deck = list(range(52))
+            rng = self.random if deal is None else random.Random(deal)
+            rng.shuffle(deck)
+            deal = deck
+        self.state = dealPosition(deal, self.game)
+        self.mask = None
+        self.done = False
+        return self.state
+
+    def legalMask(self):
+        if self.mask is None:
+            self.mask = legalMask(self.state, self.game)
+        return self.mask
+
+    def legalActions(self):
+        return [a for a, legal in enumerate(self.legalMask()) if legal]
+
+    def step(self, action):
+        if self.done:
+            return self.state, 0, True
+        source, target = divmod(action, RULES[self.game].npiles)
+        n = moveCount(self.state, self.game, source, target)
+        if not n:
+            raise ValueError('illegal action %d'%action)
+        position = move(self.state, source, target, n)
+        position, reward = autoplay(position, self.game)
+        if target >= RULES[self.game].foundationBase:
+            reward += 1
+        self.state = position
+        self.mask = None
+        self.done = won(position) or not any(self.legalMask())
+        return position, reward, self.done
+
+    def clone(self):
+        '''
+        An independent environment in the same position
+        '''
+        other = FreecellEnv.__new__(FreecellEnv)
+        other.__dict__.update(self.__dict__)
+        other.random = random.Random()
+        other.random.setstate(self.random.getstate())
+        return other
+
+class VectorEnv:
+    '''
+    A batch of independent environments stepped together.
+    Environments that are done ignore their actions until they are reset.
+    '''
+    def __init__(self, n, game=FREECELL, seed=None):
+        rng = random.Random(seed)
+        self.envs = [FreecellEnv(game, rng.random()) for k in range(n)]
+
+    def __len__(self):
+        return len(self.envs)
+
+    def reset(self, deals=None):
+        if deals is None:
+            deals = [None]*len(self.envs)
+        return [env.reset(deal) for env, deal in zip(self.envs, deals)]
+
+    def legalMasks(self):
+        return [env.legalMask() for env in self.envs]
+
+    def step(self, actions):
+        '''
+        Return lists of states, rewards, and done flags
+        '''
+        states, rewards, dones = [], [], []
+        for env, action in zip(self.envs, actions):
+            state, reward, done = env.step(action)
+            states.append(state)
+            rewards.append(reward)
+            dones.append(done)
+        return states, rewards, dones
+
+    def clone(self):
+        other = VectorEnv.__new__(VectorEnv)
+        other.envs = [env.clone() for env in self.envs]
+        return other
@@ -7,18 +7,22 @@ and the foundation piles.  Also, they don't include solvers.
 '''
 import model
 from view import View
+from variants import VARIANTS
+from journal import Journal, journalName, findJournals, readJournal
+import profiler
 
 import tkinter as tk
 from tkinter.messagebox import showerror, showinfo, askokcancel
-import sys, os
+import sys, os, time
 
 helpText = '''
-This program implements three variants related solitaire (patience) games: \
-freecell, forecell, and Baker's game.  The games differ only \
-in the rules for moving cards.
+This program implements several related solitaire (patience) games: \
+freecell, forecell, Baker's game, Seahaven Towers, Eight Off, and relaxed freecell.  \
+The first three games differ only in the rules for moving cards.  The others \
+are described under OTHER GAMES.
 
 OBJECTIVE
-All three games  are played with a deck of 52 cards.\
+All the games  are played with a deck of 52 cards.\
 The objective in each game is to arrange each of the four suits in sequence \
 from the Ace to the King on the foundations piles.\
 If all suits have been built on the foundations, the game is won.
@@ -57,12 +61,28 @@ except at the very beginning of the game.
 
 BUTTONS
 The "Undo" and Redo" buttons are self-explanatory.  \
+The "Hint" button outlines a good move to make next, and where to put the cards.  \
+It may take a moment after each move, while the program looks for a solution.  \
 The "Restart" button puts the game back to the beginning, but you can \
 still redo all your moves. 
 
+RECOVERY
+The game in progress is saved as you play.  If the program stops without \
+being quit, it offers to resume the game the next time it starts.
+
 DOUBLE-CLICK
 Double-clicking the top card of a tableau pile will move it to a free cell, \
 if there is one available.
+
+OTHER GAMES
+Seahaven Towers has ten tableau piles of five cards each, and the last two cards \
+are dealt to the free cells.  Eight Off has eight tableau piles of six cards each \
+and eight free cells, four of which hold the last four cards.  In both games, the \
+tableau is built down by suit, only a King may be played to an empty tableau pile, \
+and only as many cards can be moved at once as there are free cells, plus one.
+
+Relaxed freecell is freecell with no limit on the number of cards that can be \
+moved at once.
 '''        
 class FreeCell:
     def __init__(self):
@@ -72,18 +92,62 @@ class FreeCell:
         self.runDir = os.path.join(cwd, progDir)         
         self.model = model.model
         self.model.parent = self
+        self.profiler = None
+        if profiler.enabled():
+            self.profiler = profiler.Profiler()
+            self.profiler.install(View, model.Model)
         self.view = View(self, self.quit, width=1000, height=1000, scrollregion=(0, 0, 950, 3000) )
+        if self.profiler:
+            self.profiler.attach(self.view)
         self.gameType = tk.IntVar()
         self.gameType.set(0)            
         self.makeHelp()
         self.makeMenu()
         self.gameType.trace('w', self.optionChanged)       
+        self.startJournal()
         self.view.start()      #  start the event loop
 
     def deal(self):
         model = self.model
         model.deal()
+        self.view.layout()
         self.view.show()
+        self.view.positionChanged()
+
+    def startJournal(self):
+        '''
+        Record the game in a journal, so it can be recovered after a crash.
+        First offer to resume the game of a session that did not end normally.
+        '''
+        dirname = os.path.join(self.runDir, 'savedGames', 'journal')
+        old = findJournals(dirname)
+        recovered = None
+        for filename in old:
+            recovered = readJournal(filename)
+            if recovered and recovered.ops:
+                break
+            recovered = None
+        self.journal = self.model.journal = Journal(journalName(dirname))
+        if recovered and askokcancel('Recover Game', 
+                                     'A game was in progress when the program stopped.\n'
+                                     'Resume it?', parent=self.view.canvas):
+            model = self.model
+            self.gameType.set(recovered.gameType)
+            try:
+                model.restore(recovered.gameType, recovered.codes, recovered.ops)
+            except (IndexError, KeyError, ValueError):
+                showerror('Recover Game', 'The game could not be recovered', 
+                          parent=self.view.canvas)
+                self.deal()
+            else:
+                self.view.layout()
+                self.view.show()
+                self.view.positionChanged()
+        for filename in old:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
 
     def makeHelp(self):
         top = self.helpText = tk.Toplevel()
@@ -118,34 +182,44 @@ class FreeCell:
         top.add_cascade(label='Game', menu=game)
         
         options = tk.Menu(top, tearoff=False)
-        options.add_radiobutton(label='Freecell', variable=gameVar, value=0)
-        options.add_radiobutton(label='Forecell',  variable=gameVar, value=1)
-        options.add_radiobutton(label="Baker's Game",  variable=gameVar, value=2)
+        for value, variant in enumerate(VARIANTS):
+            options.add_radiobutton(label=variant.title, variable=gameVar, value=value)
         top.add_cascade(label='Options', menu=options)        
 
+        if self.profiler:
+            profile = tk.Menu(top, tearoff=False)
+            profile.add_command(label='Overlay', command=self.profiler.toggleOverlay)
+            profile.add_command(label='Save Report', command=self.saveProfile)
+            top.add_cascade(label='Profile', menu=profile)
+
+    def saveProfile(self):
+        filename = os.path.join(self.runDir, 'savedGames', 'profile', 
+                                'profile-%s.txt'%time.strftime('%Y%m%d-%H%M%S'))
+        try:
+            self.profiler.dump(filename)
+        except OSError as e:
+            showerror('Save Report', str(e), parent=self.view.canvas)
+        else:
+            showinfo('Save Report', 'Saved in %s'%filename, parent=self.view.canvas)
+
     def showHelp(self):
         self.helpText.deiconify()
         self.helpText.text.see('1.0')  
         
     def optionChanged(self, *args):
         model = self.model
-        titles = ['Freecell Solitaire',
-                       'Forecell Solitaire',
-                       "Baker's Game"]
-        try:        
-            game = model.gameType
-            title = titles[game]
+        if model.tableau[0]:
+            title = VARIANTS[model.gameType].title
             showinfo(title, 'Game change will take effect next deal', 
                         parent=self.view.canvas)
-        except AttributeError:
+        else:
             game = self.gameType.get()
-            self.view.root.title(titles[game])
+            self.view.root.title(VARIANTS[game].title)
             
     def quit(self):
-        try:
-            self.model.solverProc.kill()
-        except:
-            pass
+        self.model.solverPool.shutdown()
+        self.model.hintEngine.stop()
+        self.journal.close(remove=True)
         self.view.root.quit()
 
 if __name__ == "__main__":
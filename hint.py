@@ -0,0 +1,205 @@
+# hint.py Background search for the next move from the current position
+
+'''
+The HintEngine searches for a solution from the position the player is in,
+in a background thread, and restarts whenever the position changes.
+
+The search is a depth-first search in which the moves from each position are
+tried best first, as fc-solve does by default.  Two things are kept from one
+search to the next:
+    -- the solution found, as a map from each position on it to the move to
+       make there, so that if the player makes the suggested move the next
+       hint is already known;
+    -- the positions whose every move was tried without success, so that a
+       search from a nearby position does not explore them again.
+Positions are compared in the canonical form of canonical(), so that
+positions that differ only in the order of the piles are the same.
+'''
+import threading, itertools
+from collections import namedtuple
+import env
+from variants import RULES, RANK
+
+Hint = namedtuple('Hint', 'source target cards')
+
+RUNNING = 'running'
+NONE = 'none'               # the search failed or ran out of nodes
+
+def canonical(position, rules):
+    base = rules.cellBase
+    return (tuple(sorted(position[:base])),
+            tuple(sorted(position[base:rules.foundationBase])),
+            tuple(len(f) for f in position[rules.foundationBase:]))
+
+def score(position, rules):
+    '''
+    Larger is better:  cards on the foundations and free space, less cards
+    on top of lower cards.
+    '''
+    base = rules.foundationBase
+    value = 8*sum(len(f) for f in position[base:])
+    value += 2*sum(1 for pile in position[:base] if not pile)
+    for pile in position[:rules.cellBase]:
+        low = 14
+        for card in pile:
+            rank = RANK[card]
+            if rank > low:
+                value -= 1
+            else:
+                low = rank
+    return value
+
+def children(position, game, rules):
+    '''
+    (score, action, position) for each legal move, after the automatic
+    moves, best first
+    '''
+    npiles = rules.npiles
+    mask = env.legalMask(position, game)
+    result = []
+    for action, legal in enumerate(mask):
+        if not legal:
+            continue
+        source, target = divmod(action, npiles)
+        n = env.moveCount(position, game, source, target)
+        child = env.autoplay(env.move(position, source, target, n), game)[0]
+        result.append((score(child, rules), action, child))
+    result.sort(key=lambda c: c[0], reverse=True)
+    return result
+
+class HintEngine:
+    def __init__(self, budget=50000, maxDead=500000):
+        self.budget = budget              # positions examined per search
+        self.maxDead = maxDead
+        self.cond = threading.Condition()
+        self.generation = 0
+        self.request = None               # (generation, position, game)
+        self.result = None                # (generation, Hint or NONE)
+        self.path = {}                    # position on last solution -> action
+        self.dead = set()                 # canonical positions with no solution
+        self.game = None
+        self.thread = None
+        self.stopped = False
+
+    def submit(self, position, game):
+        '''
+        Start looking for a hint from position.  Any search for an earlier
+        position is abandoned.
+        '''
+        with self.cond:
+            if self.request is not None and self.request[1:] == (position, game):
+                return
+            self.generation += 1
+            self.request = (self.generation, position, game)
+            self.result = None
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.work, name='hint', daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def poll(self):
+        '''
+        RUNNING, NONE, or the Hint for the last position submitted
+        '''
+        with self.cond:
+            if self.result is None or self.result[0] != self.generation:
+                return RUNNING
+            return self.result[1]
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.generation += 1
+            self.cond.notify()
+
+    def current(self, generation):
+        return generation == self.generation and not self.stopped
+
+    def work(self):
+        done = 0
+        while True:
+            with self.cond:
+                while not self.stopped and self.generation == done:
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                generation, position, game = self.request
+                done = generation
+            answer = self.hint(position, game, generation)
+            with self.cond:
+                if self.current(generation):
+                    self.result = (generation, answer)
+
+    def hint(self, position, game, generation):
+        if game != self.game:
+            self.game = game
+            self.path = {}
+            self.dead = set()
+        rules = RULES[game]
+        action = self.path.get(position)
+        if action is None:
+            action, exhausted, usedOld = self.search(position, game, rules, generation)
+            if exhausted and usedOld:
+                # a position may have been marked dead only because of the
+                # path that led to it in an earlier search
+                self.dead = set()
+                action, exhausted, usedOld = self.search(position, game, rules, generation)
+        if action is None:
+            return NONE
+        source, target = divmod(action, rules.npiles)
+        return Hint(source, target, env.moveCount(position, game, source, target))
+
+    def search(self, root, game, rules, generation):
+        '''
+        Return the first action of a solution from root, or None, whether
+        every position reachable from root was tried, and whether any
+        position was skipped because an earlier search found it dead.
+        '''
+        if env.won(root):
+            return None, False, False
+        old = self.dead
+        dead = set()                      # positions found dead by this search
+        usedOld = False
+        key = canonical(root, rules)
+        visited = {key}
+        onPath = [(root, None, iter(children(root, game, rules)))]
+        count = 0
+        while onPath:
+            count += 1
+            if count > self.budget or (count%256 == 0 and not self.current(generation)):
+                self.keep(dead)
+                return None, False, usedOld
+            position, action, moves = onPath[-1]
+            for value, move, child in moves:
+                if env.won(child):
+                    path = [(p, a) for p, a, m in onPath[1:]] + [(child, move)]
+                    self.path = {}
+                    prev = root
+                    for p, a in path:
+                        self.path[prev] = a
+                        prev = p
+                    self.keep(dead)
+                    return (onPath[1][1] if len(onPath) > 1 else move), False, usedOld
+                key = canonical(child, rules)
+                if key in visited or key in dead:
+                    continue
+                if key in old:
+                    usedOld = True
+                    continue
+                visited.add(key)
+                onPath.append((child, move, iter(children(child, game, rules))))
+                break
+            else:
+                onPath.pop()
+                dead.add(canonical(position, rules))
+        self.keep(dead)
+        return None, True, usedOld
+
+    def keep(self, dead):
+        '''
+        Add the positions a search found dead to those kept for later searches
+        '''
+        room = self.maxDead-len(self.dead)
+        if len(dead) > room:
+            dead = itertools.islice(dead, max(room, 0))
+        self.dead.update(dead)
@@ -0,0 +1,216 @@
+# journal.py Crash-safe record of the game in progress
+
+'''
+The journal is an append-only file holding the deal of the current game and
+every change the Model makes to its undo stack, so that a game can be
+recovered if the program dies.
+
+Records are kept in memory and written by a background thread, which
+calls fsync once for each batch of records rather than once per move, so
+recording a move costs the player nothing but a list append.  A batch is
+written when it holds `batch` records or is `interval` seconds old.
+
+The file is text.  The first line is
+    freecell-journal 2 <game type> <52 card codes in the order dealt>
+and each later line is one of
+    m code      a move pushed on the undo stack
+    r code      a move popped off the redo stack and made
+    u           a move undone
+    d           the cards put back as dealt, with empty stacks
+    s codes     the solver's moves put on the redo stack
+    w           the move before made the foundations complete
+where code is the move's 16 bit code from moves.py, in hex, and codes are
+the bytes of the redo stack from MoveList.tobytes, in hex.
+A line cut short by a crash is ignored when the journal is read.  A journal
+whose last line is w holds a game that was won, so there is nothing to recover.
+'''
+import os, time, threading, getpass
+from collections import namedtuple
+from moves import MoveList, encode, decode
+
+MAGIC = 'freecell-journal'
+VERSION = '2'
+
+Recovered = namedtuple('Recovered', 'filename gameType codes ops')
+
+class Journal:
+    def __init__(self, filename, batch=32, interval=0.5):
+        self.filename = filename
+        self.batch = batch
+        self.interval = interval
+        self.pending = []
+        self.cond = threading.Condition()      # guards pending and closed
+        self.fileLock = threading.Lock()       # guards file and epoch
+        self.epoch = 0                         # number of the deal being recorded
+        self.file = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.work, name='journal', daemon=True)
+        self.thread.start()
+
+    def start(self, gameType, codes):
+        '''
+        Begin the journal of a new deal, replacing the old one
+        '''
+        with self.fileLock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+                self.file = open(self.filename, 'w')
+            self.file.seek(0)
+            self.file.truncate()
+            with self.cond:
+                self.epoch += 1
+                self.pending = ['%s %s %d %s\n'%(MAGIC, VERSION, gameType, ' '.join(codes))]
+                self.cond.notify()
+
+    def record(self, op, record=None):
+        '''
+        Queue one record.  record is an UndoRecord, for the ops that have one.
+        '''
+        if record is None:
+            line = op+'\n'
+        else:
+            line = '%s %04x\n'%(op, encode(*record))
+        self.queue(line)
+
+    def recordMoves(self, op, moves):
+        '''
+        Queue a record of a MoveList
+        '''
+        self.queue('%s %s\n'%(op, moves.tobytes().hex()))
+
+    def queue(self, line):
+        with self.cond:
+            pending = self.pending
+            pending.append(line)
+            # wake the writer to start the interval, or to write a full batch
+            if len(pending) == 1 or len(pending) >= self.batch:
+                self.cond.notify()
+
+    def work(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if len(self.pending) < self.batch and not self.closed:
+                    # let a batch build up, but no longer than interval
+                    self.cond.wait(self.interval)
+                lines, self.pending = self.pending, []
+                epoch = self.epoch
+                closed = self.closed
+            self.write(lines, epoch)
+            if closed:
+                return
+
+    def write(self, lines, epoch):
+        '''
+        Write lines and sync the file, unless a new deal has been started
+        since they were queued
+        '''
+        with self.fileLock:
+            if not lines or self.file is None or epoch != self.epoch:
+                return
+            self.file.write(''.join(lines))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def flush(self):
+        '''
+        Write and sync any queued records now
+        '''
+        with self.cond:
+            lines, self.pending = self.pending, []
+            epoch = self.epoch
+        self.write(lines, epoch)
+
+    def close(self, remove=False):
+        '''
+        Stop the journal.  If remove is True, the game is finished with,
+        and the file is deleted.
+        '''
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+        with self.fileLock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+                if remove:
+                    os.remove(self.filename)
+
+def journalName(dirname):
+    '''
+    A new journal file name for this user's session
+    '''
+    return os.path.join(dirname, 'journal-%s-%d-%d.txt'%(getpass.getuser(), int(time.time()), os.getpid()))
+
+def running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+def findJournals(dirname):
+    '''
+    Journals this user's earlier sessions left behind, newest first.
+    Journals of sessions that are still running are left alone.
+    '''
+    try:
+        names = os.listdir(dirname)
+    except OSError:
+        return []
+    prefix = 'journal-%s-'%getpass.getuser()
+    found = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        try:
+            pid = int(name[:-4].split('-')[-1])
+        except ValueError:
+            continue
+        if pid == os.getpid() or not running(pid):
+            found.append(os.path.join(dirname, name))
+    return sorted(found, key=os.path.getmtime, reverse=True)
+
+def readJournal(filename):
+    '''
+    Return the Recovered game in the journal, or None if it has none, or
+    holds a game that was won.
+    ops is a list of (op, UndoRecord), with a MoveList for s and None for
+    the ops without a move.
+    '''
+    try:
+        with open(filename) as fin:
+            text = fin.read()
+    except OSError:
+        return None
+    lines = text.split('\n')
+    lines.pop()                # empty, or a line the crash cut short
+    if not lines:
+        return None
+    header = lines[0].split()
+    if header[:2] != [MAGIC, VERSION] or len(header) != 55 or not header[2].isdigit():
+        return None
+    ops = []
+    for line in lines[1:]:
+        fields = line.split()
+        if fields in (['u'], ['d'], ['w']):
+            ops.append((fields[0], None))
+        elif len(fields) == 2 and fields[0] in ('m', 'r') and len(fields[1]) == 4:
+            try:
+                ops.append((fields[0], decode(int(fields[1], 16))))
+            except ValueError:
+                break
+        elif fields[:1] == ['s'] and len(fields) <= 2:
+            try:
+                ops.append(('s', MoveList.frombytes(bytes.fromhex(''.join(fields[1:])))))
+            except ValueError:
+                break
+        else:
+            break
+    if ops and ops[-1][0] == 'w':
+        return None
+    return Recovered(filename, int(header[2]), header[3:], ops)
@@ -1,36 +1,19 @@
-# model.py Model for freecell solitaire, forecell and Baker's game
+# model.py Model for freecell solitaire, forecell, Baker's game and related games
 
 import random, itertools,sys
-from collections import namedtuple
-import re, os, subprocess
-
-UndoRecord = namedtuple('Undorecord', 'source target cards auto'.split())
+import os
+from solver import SolverPool, DONE, TIMEOUT, ERROR, CANCELLED
+from variants import RULES, FREECELL, SUIT_NAMES, RANK_NAMES
+from hint import HintEngine
+from moves import MoveList, UndoRecord, parseMoves
+import env
 
 ACE = 1
 JACK = 11
 QUEEN = 12
 KING = 13
 ALLRANKS = range(1, 14)      # one more than the highest value
-FREECELL = 0
-FORECELL = 1
-BAKERS_GAME = 2
-
-# presets for the solver
-presets = ['freecell', 'forecell', 'bakers_game']
-
-# patterns to parse solver output
-movePattern = re.compile(r'(^Move.*)', re.MULTILINE)
-freePattern = re.compile(r'^Freecells:(.*)$',re.MULTILINE)
-stack2stackPattern = re.compile(r'.*?([0-9]+) .*? ([0-9]+).*?([0-9]+)')
-stackCellPattern=re.compile(r'.*?(cell|stack).*?([0-9]+).*?([0-9]+)')
-foundationPattern = re.compile(r'.*?(cell|stack).*?([0-9])+')
-
-# RANKNAMES is a list that maps a rank to a string.  It contains a
-# dummy element at index 0 so it can be indexed directly with the card
-# value.
-
-SUIT_NAMES = 'SHDC'
-RANK_NAMES = ' A23456789TJQK'
+
 if sys.version_info.major == 3:
     SUIT_SYMBOLS = ('\u2660','\u2665','\u2666','\u2663') 
 else:
@@ -90,46 +73,26 @@ class TableauPile(Stack):
         Stack.__init__(self)
         
     def canSelect(self, idx):
-        game = model.gameType
+        follows = model.rules.follows
         if idx >= len(self):
             return False
         for card1, card2 in zip(self[idx:], self[idx+1:]):
-            if card2.rank != card1.rank-1:
-                return False            
-            if game != BAKERS_GAME: 
-                if card1.color == card2.color:
-                    return False
-            else:
-                if card1.suit != card2.suit:
-                    return False
+            if not follows[card2.index][card1.index]:
+                return False
         return True
     
     def canDrop(self):
         '''Can the moving cards be dropped here?'''
-        game = model.gameType
+        rules = model.rules
         source = model.selection
-        tableau = model.tableau
-        cells = model.cells
-        freeCells = len([c for c in cells if c.isEmpty()])
-        if game == FORECELL:
-            maxMove = 1+freeCells 
-        else:
-            freeTableau = len([t for t in tableau if t.isEmpty()])
-            if self.isEmpty(): freeTableau -= 1
-            maxMove = (1+freeCells)*2**freeTableau
-        if len(source)> maxMove:
+        freeCells = len([c for c in model.cells if c.isEmpty()])
+        freeTableau = len([t for t in model.tableau if t.isEmpty()])
+        if self.isEmpty(): freeTableau -= 1
+        if len(source) > rules.supermove[freeCells][freeTableau]:
             return False
         if self.isEmpty():
-            return True if game != FORECELL else source[0].rank == KING
-        lower = source[0]
-        upper = self[-1]
-        if game != BAKERS_GAME:
-            if lower.color == upper.color:
-                return False
-        else:
-            if lower.suit != upper.suit:
-                return False
-        return lower.rank == upper.rank-1        
+            return rules.emptyOK[source[0].index] == 1
+        return rules.follows[source[0].index][self[-1].index] == 1
           
 class Cell(Stack):
     def __init__(self):
@@ -169,6 +132,90 @@ class FoundationPile(Stack):
 def cardCode(rank, suit):
     return RANK_NAMES[rank]+suit
 
+FOUNDATION_ORDER = 'HCDS'       # order of the foundations in fc-solve's boards
+
+def formatBoard(tableau, cells=(), foundations=None):
+    '''
+    A board in fc-solve's format.
+    tableau is a list of lists of card codes, cells a list of card codes or None
+    for an empty cell, and foundations maps a suit to the number of cards played.
+    '''
+    if foundations is None:
+        foundations = {}
+    board = 'Foundations:'
+    for suit in FOUNDATION_ORDER:
+        board += ' %s-%s'%(suit, RANK_NAMES[foundations.get(suit, 0)].replace(' ', '0'))
+    board += '\nFreecells:'
+    cells = [code if code else '-' for code in cells]
+    while cells and cells[-1] == '-':
+        cells.pop()
+    for code in cells:
+        board += ' %s'%code
+    board += '\n'
+    for pile in tableau:
+        board += ':'
+        for code in pile:
+            board += ' %s'%code
+        board += '\n'
+    return board
+
+def parseBoard(text, rules):
+    '''
+    Parse a board in fc-solve's format for the game with the given rules.
+    Return (tableau, cells, foundations) as formatBoard takes them.
+    Raise ValueError if the board does not hold each card exactly once.
+    '''
+    tableau = []
+    cells = []
+    foundations = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('Foundations:'):
+            for item in line[12:].split():
+                suit, rank = item.split('-')
+                rank = 0 if rank == '0' else RANK_NAMES.index(rank)
+                if suit not in SUIT_NAMES or rank < 0:
+                    raise ValueError('bad foundation %s'%item)
+                foundations[suit] = rank
+        elif line.startswith('Freecells:'):
+            cells = [None if code == '-' else code for code in line[10:].split()]
+        else:
+            tableau.append(line.lstrip(':').split())
+    if len(tableau) != rules.columns:
+        raise ValueError('%d tableau piles, expected %d'%(len(tableau), rules.columns))
+    if len(cells) > rules.cells:
+        raise ValueError('%d free cells, expected %d'%(len(cells), rules.cells))
+    codes = [code for pile in tableau for code in pile] + [code for code in cells if code]
+    for suit, rank in foundations.items():
+        codes.extend(cardCode(r, suit) for r in range(1, rank+1))
+    deck = set(cardCode(rank, suit) for rank, suit in itertools.product(ALLRANKS, SUIT_NAMES))
+    if len(codes) != 52 or set(codes) != deck:
+        raise ValueError('the board must hold each card once')
+    return tableau, cells, foundations
+
+def parseSolution(text, cellBase=8):
+    '''
+    Return a MoveList of the moves in fc-solve's output.
+    Free cell k is pile cellBase+k.  The target of a move to the
+    foundations is -1.
+    '''
+    return parseMoves(text, cellBase)
+
+def solutionStatus(state, text):
+    '''
+    'solved', 'unsolved', 'intractable', or 'error' if fc-solve could not be
+    run or was stopped, for a finished SolverJob
+    '''
+    if state in (ERROR, CANCELLED):
+        return 'error'
+    if state == TIMEOUT or "Iterations count exceeded" in text:
+        return 'intractable'
+    if state != DONE or "I could not solve this game" in text:
+        return 'unsolved'
+    return 'solved'
+
 class Card:
     '''
     A card is identified by its suit and rank.
@@ -178,6 +225,7 @@ class Card:
         self.suit = suit
         self.color = 0 if suit in 'HD' else 1
         self.code =cardCode(rank, suit)
+        self.index = (rank-1)*4 + SUIT_NAMES.index(suit)    # card number in the rule tables
 
     def __repr__(self):
         return self.code
@@ -190,10 +238,11 @@ class Card:
 class Model:
     '''
     The cards are all in self.deck, and are copied into the tableau piles
+    The layout of the piles depends on the game being played, self.rules.
     All entries on the undo and redo stacks are in the form (source, target, n, f), where
-        -- tableau piles are numbered 0 to 7, 
-        -- free cells are numbered 8 to 11, 
-        -- and foundations 12 to 15, 
+        -- tableau piles are numbered 0 to columns-1 (0 to 7 in freecell), 
+        -- free cells are numbered from rules.cellBase (8 to 11 in freecell), 
+        -- and foundations from rules.foundationBase (12 to 15 in freecell), 
         n is the number of cards moved, 
         f is a boolean indicating whether or not the top card of the source stack is flipped,
         except that the entry (0, 0, 10, 0) connotes dealing a row of cards. 
@@ -202,28 +251,42 @@ class Model:
         random.seed()
         self.deck = []
         self.selection = []
-        self.undoStack = []
-        self.redoStack = []
-        self.solution = []
+        self.undoStack = MoveList()
+        self.redoStack = MoveList()
+        self.solution = MoveList()
+        self.solverPool = SolverPool()
+        self.solverJob = None
+        self.hintEngine = HintEngine()
+        self.journal = None           # set by the application to record the game
         self.createCards()
+        self.setGame(FREECELL)
+
+    def setGame(self, gameType):
+        '''
+        Create the piles for the game
+        '''
+        self.gameType = gameType
+        self.rules = rules = RULES[gameType]
         self.foundations = []
         self.cells = [ ] 
         for k in range(4):
             self.foundations.append(FoundationPile(SUIT_NAMES[k]))
         self.tableau = []
-        for k in range(8):
+        for k in range(rules.columns):
             self.tableau.append(TableauPile()) 
-        for k in range(4):
+        for k in range(rules.cells):
             self.cells.append(Cell())
         self.grabPiles = self.tableau + self.cells
         self.piles = self.grabPiles + self.foundations
 
     def shuffle(self):
-        self.gameType = self.parent.gameType.get()
+        gameType = self.parent.gameType.get()
+        if gameType != self.gameType:
+            self.setGame(gameType)
         random.shuffle(self.deck)
         self.solved = False
         self.status = None
-        self.solution = []
+        self.solution = MoveList()
 
     def createCards(self):
         for rank, suit in itertools.product(ALLRANKS, SUIT_NAMES):
@@ -234,13 +297,22 @@ class Model:
             self.shuffle()
         for p in self.piles:
             p.clear()
-        for n, card in enumerate(self.deck):
-            self.tableau[n%8].add(card)
-        self.undoStack = []
-        self.redoStack = [] 
+        rules = self.rules
+        dealt = 52 - rules.dealtCells
+        for n, card in enumerate(self.deck[:dealt]):
+            self.tableau[n%rules.columns].add(card)
+        for cell, card in zip(self.cells, self.deck[dealt:]):
+            cell.add(card)
+        self.undoStack = MoveList()
+        self.redoStack = MoveList()
+        if self.journal:
+            if shuffle:
+                self.journal.start(self.gameType, [card.code for card in self.deck])
+            else:
+                self.journal.record('d')
         
         # *** SIDE EFFECTS  ***
-        # solve will set self.solverProc, self.board, 
+        # solve will set self.solverJob, self.board, 
         # self.status, and self.solution    
         if shuffle:
             self.solve()
@@ -274,15 +346,8 @@ class Model:
         Compete a legal move.
         Tranfer the moving cards to the destination stack.
         '''
-        src = self.moveOrigin
-        source = self.piles[src]
-        select = self.selection
-        target = self.piles[dest] 
-        target.extend(self.selection)
-        source[:] = source[:self.moveIndex]
-        self.undoStack.append(UndoRecord(src, dest, len(select), False))
+        self.move(UndoRecord(self.moveOrigin, dest, len(self.selection), False))
         self.selection = []
-        self.redoStack = []
 
     def win(self):
         return all((len(f)  == 13 for f in self.foundations)) 
@@ -292,193 +357,219 @@ class Model:
         Move the top card of piles[idx] to a free cell
         '''
         piles = self.piles
-        for k in range(8,12):
+        rules = self.rules
+        for k in range(rules.cellBase, rules.foundationBase):
             if piles[k].isEmpty():
                 break
         else:   # loop else
             return False
-        piles[k].append(piles[idx].pop())
-        self.undoStack.append(UndoRecord(idx, k, 1, False))
-        self.redoStack.clear()
+        self.move(UndoRecord(idx, k, 1, False))
         return True
 
+    def move(self, record):
+        '''
+        Make a new move.  A move by the player, rather than an automatic
+        move, means the moves on the redo stack can no longer be made.
+        '''
+        if not record.auto:
+            self.redoStack.clear()
+        self.play(record, 'm')
+
+    def play(self, record, op):
+        '''
+        Move the cards as the UndoRecord says, push it on the undo stack,
+        and journal it as op.
+        '''
+        s, t, n, a = record
+        piles = self.piles
+        piles[t].extend(piles[s][-n:])
+        del piles[s][-n:]
+        self.undoStack.append(record)
+        journal = self.journal
+        if journal:
+            journal.record(op, record)
+            if self.gameWon():
+                journal.record('w')
+
+    def unplay(self):
+        '''
+        Pop a record off the undo stack, put the cards back, and push the
+        record on the redo stack
+        '''
+        s, t, n, a = record = self.undoStack.pop()
+        self.redoStack.append(record)
+        piles = self.piles
+        piles[s].extend(piles[t][-n:])
+        del piles[t][-n:]
+        if self.journal:
+            self.journal.record('u')
+
+    def replay(self):
+        '''
+        Pop a record off the redo stack and make the move.
+        If a move to the foundations has been set by the solver, the target
+        will be shown as -1, as we have to figure out the actual pile.
+        '''
+        s, t, n, a = record = self.redoStack.pop()
+        if t == -1:
+            suit = self.piles[s][-1].suit
+            record = UndoRecord(s, self.rules.foundationBase + SUIT_NAMES.index(suit), n, a)
+        self.play(record, 'r')
+
     def undo(self):
         ''''
         Pop any automatic moves off the stack and redo the corresponding moves.
         Then pop one record off the undo stack and undo the corresponding move.
         
         '''
-        def unplay():
-            (s, t, n, a) = record =  undoStack.pop()
-            redoStack.append(record)
-            source = piles[s] 
-            target = piles[t]
-            source.extend(target[-n:])
-            target[:] = target[:-n]            
-            
         undoStack = self.undoStack
-        redoStack = self.redoStack
-        piles = self.piles
         while undoStack[-1].auto : 
-            unplay()
-        unplay()
+            self.unplay()
+        self.unplay()
 
     def redo(self):
         ''''
         Pop a record off the redo stack and redo the corresponding move.
         Then pop and redo any automatic moves.
-        If a move to the foundations has been set by the solver, the target
-        will be shown as -1, as we have to figure out the actual pile.
         ''' 
-        def replay():
-            (s, t, n, a) = record = redoStack.pop()
-            source = piles[s]
-            if (t==-1):
-                suit = source[-1].suit
-                t = 12+ 'SHDC'.index(suit)
-                record = UndoRecord(s, t, n, a) 
-            undoStack.append(record)
-            target = piles[t]
-            target.extend(source[-n:])
-            source[:] = source[:-n]             
-            
-        undoStack = self.undoStack
         redoStack = self.redoStack
-        piles = self.piles        
-        replay()
-        try:
-            while redoStack[-1].auto:
-                replay()
-        except IndexError:
-            pass
+        self.replay()
+        while redoStack and redoStack[-1].auto:
+            self.replay()
             
     def canUndo(self):
-        return self.undoStack != []
+        return len(self.undoStack) > 0
 
     def canRedo(self):
-        return self.redoStack != []  
+        return len(self.redoStack) > 0
 
     def restart(self):
         while self.canUndo():
             self.undo()
 
     def automaticMove(self):
-        game = self.gameType
+        '''
+        Play one card to the foundations if the rules say it is safe.
+        Return True if a card was played.
+        '''
+        rules = self.rules
         piles = self.piles
+        base = rules.foundationBase
         foundations = self.foundations
-        reds = piles[13], piles[14]     # foundations
-        blacks = piles[12], piles[15]
-        for idx in range(12):
-            add = False
+        autoNeeds = rules.autoNeeds
+        for idx in range(base):
             source = piles[idx]
             if source.isEmpty(): continue
             card = source[-1]
-            target =piles[ 12 + SUIT_NAMES.index(card.suit)]
-            if card.rank == ACE:
-                add = True
-            elif card.rank == 2:
-                add =  not target.isEmpty()
-            else:
-                if len(target) != card.rank-1: 
-                    continue
-                if game == BAKERS_GAME:
-                    add = True
-                else:
-                    stacks = blacks if card.suit in 'HD' else reds
-                    if all(len(stack)>=card.rank-1 for stack in stacks):
-                        add = True
-                    #elif all(len(fnd)>=card.rank-2 for fnd in foundations):
-                        #add = True
-            if add:
-                target.add(source.pop())
-                self.undoStack.append(UndoRecord(idx,piles.index(target),1,True))
-                break
-        return add
+            below = card.rank-1
+            suit = card.index%4
+            target = foundations[suit]
+            if len(target) != below: 
+                continue
+            if all(len(foundations[k])>=below for k in autoNeeds[card.index]):
+                self.move(UndoRecord(idx,base+suit,1,True))
+                return True
+        return False
     
     def boardString(self):
-        board = 'Foundations: H-0 C-0 D-0 S-0\nFreecells:\n'
-        for t in self.tableau:
-            board += ':'
-            for card in t:
-                board += ' %s'%card.code
-            board += '\n'
-        return board
+        tableau = [[card.code for card in t] for t in self.tableau]
+        cells = [c[-1].code if c else None for c in self.cells]
+        return formatBoard(tableau, cells)
         
     def solve(self):
-        try:
-            self.solverProc.kill()
-        except:
-            pass
+        '''
+        Submit the board to the solver pool.
+        Any job for an earlier deal is superseded and cancelled.
+        '''
+        if self.solverJob is not None:
+            self.solverJob.cancel()
         self.board = self.boardString()
-        #cmd = os.path.join(self.parent.runDir,'fc-solve')
-        cmd = 'fc-solve'
-        args = 'echo '+'"'+self.board+'"' ' | ' +cmd+ ' '
-        game = self.gameType
-        args += '--game %s '%presets[game]
-        args += '-p -t  -m -sel'
-        print(args)
-        self.solverProc = subprocess.Popen(args, universal_newlines=True, 
-                                           stdout=subprocess.PIPE, shell=True)  
+        self.solverJob = self.solverPool.submit(self.board, self.rules.preset)
         
     def parseSolution(self, text):
-        self.solution.clear()
-        soln = self.solution
-        moves=movePattern.finditer(text)
-        for move in moves:
-            match = move.group(0)
-            if match.count('stack')==2:
-                m = stack2stackPattern.search(match)
-                g = m.group
-                soln.append(UndoRecord(int(g(2)),int(g(3)),int(g(1)),False))
-            elif 'foundation' not in match:
-                m = stackCellPattern.search(match)
-                if m.group(1) == 'stack':
-                    s = int(m.group(2))
-                    t = 8+int(m.group(3))
-                else:
-                    s = 8+int(m.group(2))
-                    t = int(m.group(3))
-                soln.append(UndoRecord(s,t,1,False))
-            else:
-                # move is to foundations
-                m = foundationPattern.search(match)
-                s = int(m.group(2)) if m.group(1)=='stack' else 8+int(m.group(2))
-                soln.append(UndoRecord(s,-1,1,False))        
+        self.solution = parseSolution(text, self.rules.cellBase)
         
     def readSolution(self):
-        proc = self.solverProc
-        status = proc.poll()
+        job = self.solverJob
+        status = job.poll()
         if status == None:
             return 'running'
         if not self.solved:
             self.solved = True
-            text= proc.stdout.read() 
-            if "Iterations count exceeded" in text:
-                self.status= 'intractable'
-            elif "I could not solve this game" in text:
-                self.status = 'unsolved'
-            else:
-                self.status = 'solved'
-                self.parseSolution(text)       # sets self.solution            
+            self.status = solutionStatus(status, job.text)
+            if self.status == 'solved':
+                self.parseSolution(job.text)       # sets self.solution            
         return self.status
     
+    def requestHint(self):
+        '''
+        Start looking for the best move from the current position.
+        The search runs in the background, and is abandoned if another
+        hint is requested first.
+        '''
+        self.hintEngine.submit(env.fromModel(self), self.gameType)
+
+    def readHint(self):
+        '''
+        Return 'running', 'none', or the Hint (source, target, cards) for
+        the position of the last request
+        '''
+        return self.hintEngine.poll()
+
+    def restore(self, gameType, codes, ops):
+        '''
+        Recover a game from a journal:  deal the cards in the order given by
+        their codes, and replay the journal's ops as they were made in play,
+        recording them in the current journal.
+        '''
+        if gameType != self.gameType:
+            self.setGame(gameType)
+        cards = {card.code:card for card in self.deck}
+        self.deck[:] = [cards[code] for code in codes]
+        self.solved = False
+        self.status = None
+        self.solution = MoveList()
+        journal, self.journal = self.journal, None
+        self.deal(False)
+        self.solve()
+        if journal:
+            journal.start(gameType, codes)
+        self.journal = journal
+        for op, record in ops:
+            if op == 'u':
+                self.unplay()
+            elif op == 'r':
+                self.replay()
+            elif op == 'd':
+                self.deal(False)
+            elif op == 'm':
+                self.move(UndoRecord(*record))
+            elif op == 's':
+                self.post(record)
+
     def postSolution(self):
         self.deal(False)
-        self.redoStack = list(reversed(self.solution))         
+        redoStack = self.solution.copy()
+        redoStack.reverse()
+        self.post(redoStack)
+
+    def post(self, redoStack):
+        '''
+        Put the solver's moves on the redo stack, and journal them
+        '''
+        self.redoStack = redoStack
+        if self.journal:
+            self.journal.recordMoves('s', redoStack)
         
     def saveGame(self):
-        gameDirs = ['freecell','bakersGame','forecell' ]
-        gameDir = gameDirs[self.gameType]
-        dirname = os.path.join(self.parent.runDir,'savedGames', gameDir)
+        '''
+        Save the deal, as it was given to the solver
+        '''
+        dirname = os.path.join(self.parent.runDir,'savedGames', self.rules.gameDir)
+        os.makedirs(dirname, exist_ok=True)
         length = 1+len([f for f in os.listdir(dirname) if f.startswith('board')])
         name = 'board%d.txt'%length
         filename = os.path.join(dirname, name)
-        deck = self.deck
         with open(filename, 'w') as fout:
-            fout.write('Foundations: H-0 C-0 D-0 S-0\nFreecells:\n')
-            for c in range(8):
-                fout.write(':')
-                for idx in range(c, 52, 8):
-                    fout.write('%s '%(deck[idx].code))
-                fout.write('\n')               
+            fout.write(self.board)
 model = Model()
\ No newline at end of file
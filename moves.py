@@ -0,0 +1,202 @@
+# moves.py Compact lists of moves, and the parser for fc-solve's solutions
+
+'''
+A move is packed into 16 bits:
+    bits 11-15   source pile
+    bits  6-10   target pile, or FOUNDATION
+    bits  1-5    number of cards
+    bit   0      1 if the move was made automatically
+with the piles numbered as in the Model.  A move to the foundations whose
+pile is not known, as in fc-solve's solutions, has the target FOUNDATION,
+which reads back as -1.
+
+A MoveList holds the codes in an array, two bytes to a move, and reads them
+back as UndoRecords.  It is used for the undo and redo stacks and for the
+solver's solutions.  A slice of a MoveList is a copy.  MoveList.view gives
+read-only access to a range of moves without copying them, but the MoveList
+cannot grow while a view of it exists, so it is not for the undo and redo
+stacks.
+
+Lists of moves are stored as their codes, two bytes each, least significant
+byte first:  see MoveList.tobytes and MoveList.frombytes.  The journal
+writes the code of each move in hex.
+
+SolutionParser reads the output of fc-solve -m, with or without -p -t,
+a line at a time, so it can be fed the output as it arrives.  Lines other
+than moves, such as the boards that -p -t prints between moves, are skipped.
+The moves look like
+    Move a card from stack 3 to the foundations
+    Move a card from freecell 0 to stack 5
+    Move 3 cards from stack 1 to stack 5
+'''
+import sys
+from array import array
+from collections import namedtuple
+
+UndoRecord = namedtuple('Undorecord', 'source target cards auto'.split())
+
+FOUNDATION = 31              # stored target of a move to an unknown foundation
+BIG_ENDIAN = sys.byteorder == 'big'
+
+def encode(source, target, cards, auto=False):
+    if target < 0:
+        target = FOUNDATION
+    if not (0 <= source < FOUNDATION and target <= FOUNDATION and 0 < cards < 32):
+        raise ValueError('move out of range: %r'%((source, target, cards, auto),))
+    return source << 11 | target << 6 | cards << 1 | (1 if auto else 0)
+
+def decode(code):
+    target = code >> 6 & 31
+    return UndoRecord(code >> 11, -1 if target == FOUNDATION else target,
+                      code >> 1 & 31, code & 1 == 1)
+
+class MoveList:
+    '''
+    A list of moves, with the methods of a list that the undo and redo
+    stacks use.  The items are UndoRecords.
+    '''
+    def __init__(self, data=None):
+        self.data = array('H') if data is None else data
+
+    @classmethod
+    def fromRecords(cls, records):
+        return cls(array('H', (encode(*record) for record in records)))
+
+    @classmethod
+    def frombytes(cls, data, copy=True):
+        '''
+        The MoveList stored in data by tobytes.  If copy is False, the
+        MoveList is a read-only view of data, where the byte order allows.
+        '''
+        if not copy and not BIG_ENDIAN:
+            return cls(memoryview(data).toreadonly().cast('B').cast('H'))
+        codes = array('H')
+        codes.frombytes(data)
+        if BIG_ENDIAN:
+            codes.byteswap()
+        return cls(codes)
+
+    def tobytes(self):
+        if BIG_ENDIAN:
+            codes = array('H', self.data)
+            codes.byteswap()
+            return codes.tobytes()
+        return self.data.tobytes()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        if not isinstance(other, MoveList):
+            return NotImplemented
+        return self.data == other.data
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return MoveList(self.data[k])
+        return decode(self.data[k])
+
+    def view(self, start=None, stop=None):
+        '''
+        A read-only MoveList that shares the data of moves start to stop
+        '''
+        return MoveList(memoryview(self.data).toreadonly()[start:stop])
+
+    def __iter__(self):
+        return map(decode, self.data)
+
+    def __reversed__(self):
+        return map(decode, reversed(self.data))
+
+    def append(self, record):
+        self.data.append(encode(*record))
+
+    def extend(self, records):
+        self.data.extend(encode(*record) for record in records)
+
+    def pop(self):
+        return decode(self.data.pop())
+
+    def clear(self):
+        del self.data[:]
+
+    def copy(self):
+        return MoveList(array('H', self.data))
+
+    def reverse(self):
+        self.data.reverse()
+
+class SolutionParser:
+    '''
+    Parse fc-solve's moves into a MoveList.
+    Free cell k is pile cellBase+k.
+    '''
+    def __init__(self, cellBase=8, moves=None):
+        self.cellBase = cellBase
+        self.moves = MoveList() if moves is None else moves
+        self.partial = ''
+
+    def feed(self, text):
+        '''
+        Parse the complete lines of text.  The end of an incomplete last
+        line is kept until more text arrives.
+        Only the move lines are looked at:  str.find skips everything else.
+        '''
+        text = self.partial+text
+        end = text.rfind('\n')+1
+        self.partial = text[end:]
+        find = text.find
+        # start is the index of the newline before a move, -1 for the first line
+        if end and text.startswith('Move'):
+            start = -1
+        else:
+            start = find('\nMove', 0, end)
+            if start == -1:
+                return self.moves
+        while True:
+            stop = find('\n', start+1, end)
+            self.parseLine(text[start+1:stop])
+            start = find('\nMove', stop, end)
+            if start == -1:
+                return self.moves
+
+    def close(self):
+        '''
+        Parse the last line, and return the MoveList
+        '''
+        if self.partial.startswith('Move'):
+            self.parseLine(self.partial)
+        self.partial = ''
+        return self.moves
+
+    def parseLine(self, line):
+        # Move <n|a> card(s) from <stack|freecell> <k> to <stack|freecell> <k> | the foundations
+        words = line.split()
+        try:
+            cards = 1 if words[1] == 'a' else int(words[1])
+            source = int(words[5])
+            if words[4] == 'freecell':
+                source += self.cellBase
+            if words[7] == 'the':
+                target = FOUNDATION
+            else:
+                target = int(words[8])
+                if words[7] == 'freecell':
+                    target += self.cellBase
+            code = encode(source, target, cards)
+        except (IndexError, ValueError):
+            raise ValueError('cannot parse move: %r'%line)
+        self.moves.data.append(code)
+
+def parseMoves(text, cellBase=8):
+    '''
+    The MoveList of the moves in the output of fc-solve.
+    text is a string, or an iterable of strings such as a file.
+    '''
+    parser = SolutionParser(cellBase)
+    if isinstance(text, str):
+        parser.feed(text)
+    else:
+        for chunk in text:
+            parser.feed(chunk)
+    return parser.close()
@@ -0,0 +1,280 @@
+# profiler.py Latency of the event handlers, to find what makes play sluggish
+
+'''
+Set FREECELL_PROFILE=1 in the environment to profile a session.  Then
+    -- the View's event handlers and the Model methods they call are timed,
+       and the times kept in histograms with a bucket for each power of 2
+       microseconds;
+    -- the Tk commands each handler sends are counted, by a proxy in front
+       of the Tcl interpreter;
+    -- a timer that should fire every HEARTBEAT seconds measures how late
+       it runs, which is how long the event loop was blocked, and the time
+       spent in View.pause, which sleeps between automatic moves, is kept
+       separately;
+    -- the Profile menu shows an overlay with the worst handlers, and saves
+       a report.
+A handler called from another handler is timed, but only the outermost
+handler counts as an event:  its time is the delay the player sees, and the
+Tk commands are charged to it.  An event that takes longer than FRAME
+seconds misses a frame.  The profiler's own Tk commands, for the heartbeat
+and the overlay, are not counted, though they may run inside a handler that
+calls update.
+
+Profiler.install must be called before the View is created, since the View
+binds its handlers when it is created.
+'''
+import os, time, functools
+
+FRAME = 1/60                 # the budget for an event
+HEARTBEAT = .01
+REFRESH = 500                # milliseconds between updates of the overlay
+BUCKETS = 32                 # bucket k holds times from 2**(k-1) to 2**k microseconds
+
+VIEW_METHODS = ('onClick', 'drag', 'onDrop', 'onDoubleClick', 'undo', 'redo', 'restart',
+                'solve', 'hint', 'showHint', 'show', 'completeMove', 'abortMove',
+                'automaticMoves', 'positionChanged', 'pause')
+MODEL_METHODS = ('grab', 'completeMove', 'abortMove', 'topToCell', 'automaticMove',
+                 'undo', 'redo', 'restart', 'readSolution', 'postSolution',
+                 'requestHint', 'readHint')
+
+def enabled():
+    return os.environ.get('FREECELL_PROFILE', '0') not in ('', '0')
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0]*BUCKETS
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        k = int(seconds*1e6).bit_length()
+        self.counts[k if k < BUCKETS else BUCKETS-1] += 1
+        self.n += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        '''
+        The upper end of the bucket holding the fraction p of the times,
+        in seconds
+        '''
+        if not self.n:
+            return 0.0
+        rank = p*self.n
+        seen = 0
+        for k, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(2**k/1e6, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total/self.n if self.n else 0.0
+
+class Stat:
+    '''
+    The times of one handler or Model method
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.times = Histogram()
+        self.events = 0              # calls that were outermost
+        self.late = 0                # events longer than FRAME
+        self.tkCalls = 0             # Tk commands sent during events
+        self.maxTk = 0
+
+class TkProxy:
+    '''
+    Stands in for a widget's Tcl interpreter, counting the commands sent
+    '''
+    def __init__(self, tk, profiler):
+        self.__dict__['tkapp'] = tk
+        self.__dict__['profiler'] = profiler
+
+    def call(self, *args):
+        if len(args) == 1 and isinstance(args[0], tuple):
+            args = args[0]
+        profiler = self.profiler
+        if profiler.own:
+            return self.tkapp.call(*args)
+        profiler.tkCalls += 1
+        if len(args) > 1 and str(args[0]).startswith('.'):
+            command = args[1]
+        else:
+            command = args[0]
+        commands = profiler.commands
+        commands[command] = commands.get(command, 0) + 1
+        return self.tkapp.call(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.tkapp, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.tkapp, name, value)
+
+class Profiler:
+    def __init__(self, frame=FRAME):
+        self.frame = frame
+        self.stats = {}
+        self.depth = 0               # handlers running
+        self.tkCalls = 0             # Tk commands sent by the event in progress
+        self.commands = {}           # Tk command -> times sent
+        self.stall = Histogram()     # lateness of the heartbeat
+        self.sleep = Histogram()
+        self.started = time.perf_counter()
+        self.view = None
+        self.due = None
+        self.overlay = False
+        self.refresh = None          # id of the after callback that redraws the overlay
+        self.own = False             # True while the profiler sends its own Tk commands
+
+    def install(self, viewClass, modelClass):
+        '''
+        Wrap the handlers of viewClass and the methods of modelClass
+        '''
+        for name in VIEW_METHODS:
+            setattr(viewClass, name, self.wrap(name, getattr(viewClass, name)))
+        for name in MODEL_METHODS:
+            setattr(modelClass, name, self.wrap('model.'+name, getattr(modelClass, name)))
+
+    def wrap(self, name, method):
+        stat = self.stats[name] = Stat(name)
+        clock = time.perf_counter
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            outer = self.depth == 0
+            if outer:
+                self.tkCalls = 0
+            self.depth += 1
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock()-start
+                self.depth -= 1
+                stat.times.add(elapsed)
+                if outer:
+                    stat.events += 1
+                    if elapsed > self.frame:
+                        stat.late += 1
+                    stat.tkCalls += self.tkCalls
+                    if self.tkCalls > stat.maxTk:
+                        stat.maxTk = self.tkCalls
+                if name == 'pause':
+                    self.sleep.add(elapsed)
+        return timed
+
+    def attach(self, view):
+        '''
+        Count the Tk commands the view's widgets send, and start the heartbeat
+        '''
+        self.view = view
+        widgets = [view.root]
+        while widgets:
+            widget = widgets.pop()
+            if not isinstance(widget.tk, TkProxy):
+                widget.tk = TkProxy(widget.tk, self)
+            widgets.extend(widget.children.values())
+        self.due = time.perf_counter()+HEARTBEAT
+        view.root.after(int(HEARTBEAT*1000), self.beat)
+
+    def beat(self):
+        now = time.perf_counter()
+        late = now-self.due
+        if late > .001:
+            self.stall.add(late)
+        self.due = now+HEARTBEAT
+        self.own = True
+        try:
+            self.view.root.after(int(HEARTBEAT*1000), self.beat)
+        finally:
+            self.own = False
+
+    def worst(self, n=None):
+        '''
+        The Stats of the handlers that have run, slowest first
+        '''
+        stats = [s for s in self.stats.values() if s.times.n]
+        stats.sort(key=lambda s: s.times.percentile(.95), reverse=True)
+        return stats[:n]
+
+    def report(self):
+        ms = 1000
+        lines = ['freecell profile:  %.0f seconds, frame budget %.1f ms'
+                 %(time.perf_counter()-self.started, self.frame*ms), '',
+                 '%-22s %7s %7s %8s %8s %8s %8s %6s %8s'
+                 %('handler', 'calls', 'events', 'mean ms', 'p50 ms', 'p95 ms', 'max ms', 'late', 'tk/event')]
+        for s in self.worst():
+            h = s.times
+            lines.append('%-22s %7d %7d %8.2f %8.2f %8.2f %8.2f %6d %8.1f'
+                         %(s.name, h.n, s.events, h.mean()*ms, h.percentile(.5)*ms,
+                           h.percentile(.95)*ms, h.max*ms, s.late,
+                           s.tkCalls/s.events if s.events else 0))
+        lines.append('')
+        for title, h in (('event loop stalls', self.stall), ('pauses', self.sleep)):
+            lines.append('%s:  %d, total %.0f ms, p95 %.1f ms, max %.1f ms'
+                         %(title, h.n, h.total*ms, h.percentile(.95)*ms, h.max*ms))
+        lines.append('')
+        lines.append('Tk commands:')
+        for command, count in sorted(self.commands.items(), key=lambda c: c[1], reverse=True):
+            lines.append('    %-20s %d'%(command, count))
+        for s in self.worst():
+            lines.append('')
+            lines.append('%s  (bucket upper bound in microseconds: count)'%s.name)
+            counts = s.times.counts
+            lines.extend('    %10d: %d'%(2**k, c) for k, c in enumerate(counts) if c)
+        return '\n'.join(lines)+'\n'
+
+    def dump(self, filename):
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        with open(filename, 'w') as fout:
+            fout.write(self.report())
+
+    def toggleOverlay(self):
+        self.overlay = not self.overlay
+        if self.refresh is not None:
+            self.own = True
+            try:
+                self.view.root.after_cancel(self.refresh)
+            finally:
+                self.own = False
+            self.refresh = None
+        self.showOverlay()
+
+    def showOverlay(self):
+        '''
+        Draw the slowest handlers in the corner of the canvas, and update
+        them every REFRESH milliseconds while the overlay is on
+        '''
+        self.own = True
+        try:
+            self.drawOverlay()
+        finally:
+            self.own = False
+
+    def drawOverlay(self):
+        canvas = self.view.canvas
+        canvas.delete('profile')
+        self.refresh = None
+        if not self.overlay:
+            return
+        ms = 1000
+        lines = ['%-16s %5s %7s %7s %5s'%('', 'n', 'p95', 'max', 'late')]
+        for s in self.worst(8):
+            h = s.times
+            lines.append('%-16s %5d %7.1f %7.1f %5d'
+                         %(s.name[:16], h.n, h.percentile(.95)*ms, h.max*ms, s.late))
+        lines.append('stalls %d  %.0f ms  max %.1f ms'
+                     %(self.stall.n, self.stall.total*ms, self.stall.max*ms))
+        x = 10
+        y = canvas.winfo_height()-10
+        text = canvas.create_text(x, y, text='\n'.join(lines), anchor='sw', fill='white',
+                                  font=('Courier', 11), tag='profile')
+        box = canvas.bbox(text)
+        rect = canvas.create_rectangle(box[0]-4, box[1]-4, box[2]+4, box[3]+4,
+                                       fill='black', outline='', tag='profile')
+        canvas.tag_lower(rect, text)
+        self.refresh = self.view.root.after(REFRESH, self.showOverlay)
@@ -0,0 +1,230 @@
+# server.py Local JSON service that solves boards with fc-solve
+
+'''
+A small HTTP service, so that several programs can share one pool of
+solver workers instead of each starting its own fc-solve processes.
+
+    POST /solve   {"board": "<board in fc-solve's format>", "game": "freecell"}
+    GET  /status
+
+game is the solver preset of one of the games in variants.py, and defaults
+to freecell.  The reply to /solve is a stream of JSON objects, one per line:
+first {"status": ...}, where the status is solved, unsolved, intractable, or
+error if fc-solve could not be run, with an "error" message in that case.
+Then, if the board was solved, one object per move
+    {"source": 3, "target": 9, "cards": 1}
+with the piles numbered as in the Model and a target of -1 for a move to
+the foundations, and finally {"moves": n}.
+
+Requests are refused with 503 when the queue of boards waiting for the
+solver is full, and with 429 when a client already has its limit of
+requests in progress.  A client names itself with the header
+    X-Client-Id: <any string>
+and all requests with the same id count against the same limit.  A request
+without the header is a client of its own, so is not limited.
+
+A request for a board that is already being solved waits for that solution
+rather than starting another.  If every client waiting for a board hangs
+up, its solver job is cancelled.
+
+    python3 server.py [--port 8765] [--workers 2] [--queue 32] [--per-client 4]
+'''
+import asyncio, json, argparse, os
+from solver import SolverPool
+from model import parseBoard, formatBoard, parseSolution, solutionStatus
+from variants import RULES
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 429: 'Too Many Requests', 503: 'Service Unavailable'}
+MAX_BODY = 1 << 16
+
+class HTTPError(Exception):
+    def __init__(self, code, message):
+        Exception.__init__(self, message)
+        self.code = code
+
+class SolveService:
+    def __init__(self, workers=2, maxQueue=32, perClient=4, timeout=60):
+        self.pool = SolverPool(workers, timeout)
+        self.maxQueue = maxQueue
+        self.perClient = perClient
+        self.clients = {}            # client address -> requests in progress
+        self.inflight = {}           # (preset, board) -> [task, waiters]
+        self.presets = {rules.preset:rules for rules in RULES}
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, headers, body = await self.readRequest(reader)
+            client = headers.get('x-client-id')
+            if client is None:
+                client = 'connection %s'%(writer.get_extra_info('peername'),)
+            if path == '/status':
+                await self.reply(writer, 200, self.status())
+            elif path != '/solve':
+                raise HTTPError(404, 'unknown path %s'%path)
+            elif method != 'POST':
+                raise HTTPError(405, 'use POST')
+            else:
+                await self.solve(reader, writer, client, body)
+        except HTTPError as e:
+            await self.reply(writer, e.code, {'error':str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def readRequest(self, reader):
+        line = (await reader.readline()).decode('latin-1').split()
+        if len(line) < 2:
+            raise HTTPError(400, 'bad request line')
+        method, path = line[0], line[1]
+        headers = {}
+        while True:
+            header = (await reader.readline()).decode('latin-1').strip()
+            if not header:
+                break
+            name, _, value = header.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, 'bad Content-Length')
+        if length > MAX_BODY:
+            raise HTTPError(413, 'request too large')
+        body = await reader.readexactly(length) if length else b''
+        return method, path, headers, body
+
+    async def reply(self, writer, code, obj):
+        data = (json.dumps(obj)+'\n').encode()
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+                      'Content-Length: %d\r\nConnection: close\r\n\r\n'
+                      %(code, REASONS[code], len(data))).encode() + data)
+        await writer.drain()
+
+    def status(self):
+        return {'queued':len(self.inflight), 'maxQueue':self.maxQueue,
+                'clients':dict(self.clients)}
+
+    def request(self, body):
+        try:
+            request = json.loads(body.decode())
+            preset = request.get('game', 'freecell')
+            rules = self.presets[preset]
+            board = formatBoard(*parseBoard(request['board'], rules))
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            raise HTTPError(400, 'bad request: %s'%e)
+        return rules, board
+
+    async def solve(self, reader, writer, client, body):
+        rules, board = self.request(body)
+        key = rules.preset, board
+        if key not in self.inflight and len(self.inflight) >= self.maxQueue:
+            raise HTTPError(503, 'solver queue is full')
+        if self.clients.get(client, 0) >= self.perClient:
+            raise HTTPError(429, 'too many requests in progress')
+        self.clients[client] = self.clients.get(client, 0) + 1
+        try:
+            entry = self.inflight.get(key)
+            if entry is None:
+                task = asyncio.ensure_future(self.run(key))
+                task.add_done_callback(lambda task: self.forget(key, task))
+                entry = self.inflight[key] = [task, 0]
+            task = entry[0]
+            entry[1] += 1
+            hangup = asyncio.ensure_future(self.hangup(reader))
+            try:
+                await asyncio.wait((task, hangup), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                hangup.cancel()
+                entry[1] -= 1
+                if entry[1] == 0 and not task.done():
+                    task.cancel()
+            if not task.done():
+                return                   # the client has gone
+            status, moves = task.result()
+            await self.stream(writer, status, moves)
+        finally:
+            self.clients[client] -= 1
+            if not self.clients[client]:
+                del self.clients[client]
+
+    async def hangup(self, reader):
+        '''
+        Return when the client closes its end of the connection
+        '''
+        try:
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+
+    def forget(self, key, task):
+        entry = self.inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self.inflight[key]
+
+    async def run(self, key):
+        '''
+        Solve one board, on behalf of every request waiting for it
+        '''
+        preset, board = key
+        job = self.pool.submit(board, preset)
+        loop = asyncio.get_running_loop()
+        try:
+            state = await loop.run_in_executor(None, job.wait)
+        except asyncio.CancelledError:
+            job.cancel()
+            raise
+        status = solutionStatus(state, job.text)
+        cellBase = self.presets[preset].cellBase
+        moves = parseSolution(job.text, cellBase) if status == 'solved' else []
+        return status, moves
+
+    async def stream(self, writer, status, moves):
+        '''
+        Send the moves as a chunked stream of JSON lines
+        '''
+        def chunk(obj):
+            data = (json.dumps(obj)+'\n').encode()
+            return b'%x\r\n%s\r\n'%(len(data), data)
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                     b'Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n')
+        if status == 'error':
+            writer.write(chunk({'status':status, 'error':'the solver could not be run'}))
+        else:
+            writer.write(chunk({'status':status}))
+        for k, (source, target, cards, auto) in enumerate(moves):
+            writer.write(chunk({'source':source, 'target':target, 'cards':cards}))
+            if k%64 == 63:
+                await writer.drain()
+        writer.write(chunk({'moves':len(moves)}))
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve freecell boards over HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--queue', type=int, default=32, help='most boards waiting or being solved')
+    parser.add_argument('--per-client', type=int, default=4, help='most requests in progress per client')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds allowed for each board')
+    args = parser.parse_args()
+    service = SolveService(args.workers, args.queue, args.per_client, args.timeout)
+
+    async def serve():
+        server = await asyncio.start_server(service.handle, args.host, args.port)
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+if __name__ == '__main__':
+    main()
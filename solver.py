@@ -0,0 +1,169 @@
+# solver.py Pool of fc-solve workers for freecell solitaire, forecell and Baker's game
+
+'''
+The solver runs in the background while the user plays.  Rather than
+starting a shell for every deal, boards are queued to a small pool of
+worker threads, each of which runs fc-solve directly and writes the board
+to its standard input.  At most one fc-solve process per worker is alive at
+any time, and a job can be cancelled when a new deal makes it obsolete.
+
+A deal is intractable when fc-solve gives up after its own limit on
+iterations, as it always has been.  A job may also be given a limit in
+seconds, after which it ends in the state TIMEOUT, but there is none by
+default, so a slow machine does not turn solvable deals into intractable ones.
+'''
+import subprocess, threading, queue
+
+# job states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+TIMEOUT = 'timeout'
+ERROR = 'error'
+
+class SolverJob:
+    '''
+    One board submitted to the pool.
+    The caller polls the job, or waits for it, and reads job.text when the
+    state is DONE.
+    '''
+    def __init__(self, board, args, timeout):
+        self.board = board
+        self.args = args
+        self.timeout = timeout
+        self.state = PENDING
+        self.text = ''
+        self.proc = None
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+
+    def poll(self):
+        '''
+        Return None while the job is pending or running, else the final state
+        '''
+        return self.state if self.finished.is_set() else None
+
+    def wait(self, timeout=None):
+        self.finished.wait(timeout)
+        return self.poll()
+
+    def cancel(self):
+        '''
+        Cancel the job.  A running fc-solve process is killed.
+        '''
+        with self.lock:
+            if self.finished.is_set():
+                return
+            self.state = CANCELLED
+            proc = self.proc
+        if proc is not None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        if proc is None:
+            self.finish(CANCELLED)
+
+    def finish(self, state, text=''):
+        with self.lock:
+            if self.state != CANCELLED:
+                self.state = state
+                self.text = text
+        self.finished.set()
+
+class SolverPool:
+    '''
+    A fixed number of worker threads, started on the first submission.
+    The number of workers bounds the number of concurrent fc-solve processes.
+    '''
+    def __init__(self, workers=2, timeout=None, command='fc-solve'):
+        self.workers = workers
+        self.timeout = timeout          # seconds allowed for each job, or None
+        self.command = command
+        self.jobs = queue.Queue()
+        self.threads = []
+        self.active = set()          # jobs being worked on
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for k in range(self.workers):
+                t = threading.Thread(target=self.work, name='solver%d'%k, daemon=True)
+                t.start()
+                self.threads.append(t)
+
+    def submit(self, board, preset, options=('-p', '-t', '-m', '-sel'), timeout=None):
+        '''
+        Queue a board for solution and return its SolverJob
+        '''
+        self.start()
+        args = [self.command, '--game', preset]
+        args.extend(options)
+        job = SolverJob(board, args, self.timeout if timeout is None else timeout)
+        self.jobs.put(job)
+        return job
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            with self.lock:
+                self.active.add(job)
+            try:
+                self.run(job)
+            finally:
+                with self.lock:
+                    self.active.discard(job)
+
+    def run(self, job):
+        with job.lock:
+            if job.state == CANCELLED:
+                job.finished.set()
+                return
+            try:
+                job.proc = proc = subprocess.Popen(job.args, universal_newlines=True,
+                                                   stdin=subprocess.PIPE,
+                                                   stdout=subprocess.PIPE,
+                                                   stderr=subprocess.DEVNULL)
+            except OSError:
+                job.state = ERROR
+                job.finished.set()
+                return
+            job.state = RUNNING
+        try:
+            text, _ = proc.communicate(job.board, timeout=job.timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            job.finish(TIMEOUT)
+            return
+        except (OSError, ValueError):
+            # the process was killed by cancel() while we were talking to it
+            proc.kill()
+            proc.wait()
+            job.finish(ERROR)
+            return
+        job.finish(DONE, text)
+
+    def shutdown(self):
+        '''
+        Cancel all pending jobs, kill the running processes, and stop the workers.
+        '''
+        pending = []
+        try:
+            while True:
+                pending.append(self.jobs.get_nowait())
+        except queue.Empty:
+            pass
+        with self.lock:
+            pending.extend(self.active)
+        for job in pending:
+            if job is not None:
+                job.cancel()
+        for t in self.threads:
+            self.jobs.put(None)
+        self.threads = []
@@ -0,0 +1,74 @@
+# test_batch.py Tests that a Batch follows the rules exactly as env.py does
+
+import random, unittest
+import env
+from variants import RULES
+try:
+    import numpy as np
+    import batch
+except ImportError:
+    batch = None
+
+@unittest.skipIf(batch is None, 'needs numpy')
+class BatchTest(unittest.TestCase):
+    '''
+    Random play on a Batch and on a FreecellEnv for each of its boards,
+    with the same actions, in every game
+    '''
+    boards = 16
+    steps = 60
+
+    def check(self, b, envs, game):
+        nactions = RULES[game].nactions
+        npiles = RULES[game].npiles
+        counts = b.moveCounts()
+        for i, e in enumerate(envs):
+            self.assertEqual(b.position(i), e.state)
+            expected = [env.moveCount(e.state, game, *divmod(a, npiles)) for a in range(nactions)]
+            self.assertEqual(counts[i].tolist(), expected)
+            self.assertEqual(b.legalMask()[i].tolist(), list(e.legalMask()))
+
+    def testRandomPlay(self):
+        rng = random.Random(5)
+        for game in range(len(RULES)):
+            seeds = [rng.randrange(10**6) for k in range(self.boards)]
+            envs = [env.FreecellEnv(game) for seed in seeds]
+            decks = []
+            for e, seed in zip(envs, seeds):
+                e.reset(seed)
+                deck = list(range(52))
+                random.Random(seed).shuffle(deck)
+                decks.append(deck)
+            b = batch.Batch.fromDecks(decks, game)
+            for step in range(self.steps):
+                self.check(b, envs, game)
+                actions = []
+                for e in envs:
+                    legal = e.legalActions()
+                    actions.append(rng.choice(legal) if legal and not e.done else -1)
+                rewards, done = b.step(actions)
+                for i, (e, action) in enumerate(zip(envs, actions)):
+                    if action >= 0:
+                        state, reward, finished = e.step(action)
+                        self.assertEqual(reward, rewards[i], (game, step, i))
+                        self.assertEqual(finished, bool(done[i]), (game, step, i))
+            self.check(b, envs, game)
+
+    def testAutoplay(self):
+        rng = random.Random(6)
+        for game in range(len(RULES)):
+            positions = [env.FreecellEnv(game).reset(rng.randrange(10**6)) for k in range(self.boards)]
+            b = batch.Batch.fromPositions(positions, game)
+            played = b.autoplay()
+            for i, position in enumerate(positions):
+                position, n = env.autoplay(position, game)
+                self.assertEqual(b.position(i), position)
+                self.assertEqual(played[i], n)
+
+    def testIllegalAction(self):
+        b = batch.Batch.fromDecks([list(range(52))], 0)
+        illegal = b.moveCounts()[0].tolist().index(0)
+        self.assertRaises(ValueError, b.step, np.array([illegal]))
+
+if __name__ == '__main__':
+    unittest.main()
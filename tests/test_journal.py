@@ -0,0 +1,153 @@
+# test_journal.py Tests of the journal and of recovering a game from it
+
+import os, random, shutil, tempfile, time, types, unittest
+import env
+import model
+from journal import Journal, readJournal
+from moves import MoveList
+from variants import RULES
+
+CODES = ['%s%s'%(rank, suit) for rank in 'A23456789TJQK' for suit in 'SHDC']
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'journal.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def lines(self):
+        with open(self.filename) as fin:
+            return fin.read().splitlines()
+
+    def testSingleRecordWrittenWithinInterval(self):
+        journal = Journal(self.filename, batch=32, interval=.2)
+        try:
+            journal.start(0, CODES)
+            time.sleep(.4)
+            journal.record('m', (3, 9, 1, False))
+            deadline = time.time()+1
+            while len(self.lines()) < 2 and time.time() < deadline:
+                time.sleep(.02)
+            self.assertEqual(self.lines()[1:], ['m 1a42'])
+        finally:
+            journal.close()
+
+    def testBadHeader(self):
+        for header in ('freecell-journal 2 x '+' '.join(CODES), 'freecell-journal 1 0 '+' '.join(CODES),
+                       'freecell-journal 2 0 AS', 'nonsense'):
+            with open(self.filename, 'w') as fout:
+                fout.write(header+'\nm 1a42\n')
+            self.assertIsNone(readJournal(self.filename), header)
+
+    def testTornLineAndWonGame(self):
+        with open(self.filename, 'w') as fout:
+            fout.write('freecell-journal 2 0 %s\nm 1a42\nu\nm 1'%' '.join(CODES))
+        recovered = readJournal(self.filename)
+        self.assertEqual([op for op, record in recovered.ops], ['m', 'u'])
+        self.assertEqual(recovered.ops[0][1], (3, 9, 1, False))
+        with open(self.filename, 'a') as fout:
+            fout.write('a42\nw\n')
+        self.assertIsNone(readJournal(self.filename))
+
+class RestoreTest(unittest.TestCase):
+    '''
+    A game played at random and recovered from its journal has the same
+    piles and the same undo and redo stacks
+    '''
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.m = m = model.Model()
+        m.solverPool.command = os.devnull
+        # the piles check moves against the module's model
+        self.singleton, model.model = model.model, m
+
+    def tearDown(self):
+        model.model = self.singleton
+        self.m.solverPool.shutdown()
+        self.m.hintEngine.stop()
+        shutil.rmtree(self.dirname)
+
+    def start(self, game):
+        m = self.m
+        m.parent = types.SimpleNamespace(gameType=types.SimpleNamespace(get=lambda: game))
+        filename = os.path.join(self.dirname, 'j%d.txt'%game)
+        m.journal = Journal(filename, interval=.01)
+        m.deal()
+        return filename
+
+    def play(self, game, rng, steps=300):
+        m = self.m
+        rules = RULES[game]
+        for step in range(steps):
+            r = rng.random()
+            if r < .15 and m.canUndo():
+                m.undo()
+            elif r < .25 and m.canRedo():
+                m.redo()
+            elif r < .27:
+                m.restart()
+            else:
+                position = env.fromModel(m)
+                actions = env.legalActions(position, game)
+                if not actions:
+                    break
+                s, t = divmod(rng.choice(actions), rules.npiles)
+                n = env.moveCount(position, game, s, t)
+                if s < rules.cellBase <= t < rules.foundationBase and rng.random() < .5:
+                    m.topToCell(s)
+                else:
+                    m.grab(s, len(m.piles[s])-n)
+                    m.completeMove(t)
+                # as the view does after each move
+                while m.automaticMove():
+                    pass
+
+    def check(self, filename):
+        '''
+        Close the journal, recover the game from it, and compare
+        '''
+        m = self.m
+        m.journal.close()
+        m.journal = None
+        position = env.fromModel(m)
+        undoStack, redoStack = m.undoStack.copy(), m.redoStack.copy()
+        recovered = readJournal(filename)
+        if env.won(position):
+            self.assertIsNone(recovered)
+            return
+        m.restore(recovered.gameType, recovered.codes, recovered.ops)
+        self.assertEqual(env.fromModel(m), position)
+        self.assertEqual(m.undoStack, undoStack)
+        self.assertEqual(m.redoStack, redoStack)
+
+    def testRestore(self):
+        rng = random.Random(7)
+        for game in range(len(RULES)):
+            filename = self.start(game)
+            self.play(game, rng)
+            self.check(filename)
+
+    def testPostedSolution(self):
+        '''
+        Moves posted from the solver, as fc-solve gives them with the
+        foundations as -1, and partly replayed
+        '''
+        rng = random.Random(8)
+        m = self.m
+        for game in range(len(RULES)):
+            foundationBase = RULES[game].foundationBase
+            filename = self.start(game)
+            self.play(game, rng, 40)
+            m.solution = MoveList.fromRecords((s, -1 if t >= foundationBase else t, n, False)
+                                              for s, t, n, a in m.undoStack)
+            m.postSolution()
+            for k in range(rng.randrange(len(m.redoStack)+1)):
+                m.redo()
+            if m.canUndo() and rng.random() < .5:
+                m.undo()
+            self.check(filename)
+
+if __name__ == '__main__':
+    unittest.main()
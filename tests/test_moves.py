@@ -0,0 +1,119 @@
+# test_moves.py Tests of the parser for fc-solve's solutions
+
+import os, random, unittest
+from moves import MoveList, SolutionParser, parseMoves
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+# data/synthetic-m.txt and data/synthetic-pt.txt are written in the form of
+# fc-solve -m and fc-solve -m -p -t, for legal moves from a deal, rather than
+# captured from fc-solve.  These are their moves, with free cells from pile 8.
+GOLDEN = [(3, 11, 1, False), (0, 10, 1, False), (7, 9, 1, False), (11, 2, 1, False),
+          (0, -1, 1, False), (2, 5, 2, False), (10, 5, 1, False), (7, 11, 1, False),
+          (5, 4, 3, False), (7, 10, 1, False), (11, -1, 1, False)]
+
+def read(name):
+    with open(os.path.join(DATA, name)) as fin:
+        return fin.read()
+
+def moveLine(source, target, cards, cellBase):
+    def pile(k):
+        return 'freecell %d'%(k-cellBase) if k >= cellBase else 'stack %d'%k
+    what = 'a card' if cards == 1 else '%d cards'%cards
+    where = 'the foundations' if target < 0 else pile(target)
+    return 'Move %s from %s to %s'%(what, pile(source), where)
+
+def feedChunks(text, rng, cellBase=8):
+    '''
+    Feed text to a parser in pieces of random length, some empty
+    '''
+    parser = SolutionParser(cellBase)
+    k = 0
+    while k < len(text):
+        n = rng.choice((0, 1, 2, 5, 17, 100, 1000))
+        parser.feed(text[k:k+n])
+        k += n
+    return list(parser.close())
+
+class GoldenTest(unittest.TestCase):
+    def testStandard(self):
+        self.assertEqual(list(parseMoves(read('synthetic-m.txt'))), GOLDEN)
+
+    def testBoards(self):
+        self.assertEqual(list(parseMoves(read('synthetic-pt.txt'))), GOLDEN)
+
+    def testFile(self):
+        with open(os.path.join(DATA, 'synthetic-pt.txt')) as fin:
+            self.assertEqual(list(parseMoves(fin)), GOLDEN)
+
+    def testNoFinalNewline(self):
+        text = read('synthetic-m.txt')
+        text = text[:text.rindex('Move')]+'Move a card from freecell 2 to stack 7'
+        self.assertEqual(list(parseMoves(text)), GOLDEN[:-1]+[(10, 7, 1, False)])
+
+    def testCellBase(self):
+        moves = parseMoves(read('synthetic-m.txt'), cellBase=10)
+        expected = [(s+2 if s >= 8 else s, t+2 if t >= 8 else t, n, a) for s, t, n, a in GOLDEN]
+        self.assertEqual(list(moves), expected)
+
+    def testChunks(self):
+        rng = random.Random(1)
+        for name in ('synthetic-m.txt', 'synthetic-pt.txt'):
+            text = read(name)
+            for trial in range(50):
+                self.assertEqual(feedChunks(text, rng), GOLDEN, name)
+
+    def testBadMove(self):
+        self.assertRaises(ValueError, parseMoves, 'Move a card from stack x to stack 2\n')
+        self.assertRaises(ValueError, parseMoves, 'Move a card\n')
+
+class MoveListTest(unittest.TestCase):
+    def testSliceIsCopy(self):
+        moves = MoveList.fromRecords(GOLDEN)
+        part = moves[2:5]
+        moves.append((0, 8, 1, True))
+        self.assertEqual(list(part), GOLDEN[2:5])
+        self.assertEqual(moves[-1], (0, 8, 1, True))
+
+    def testView(self):
+        moves = MoveList.fromRecords(GOLDEN)
+        view = moves.view(2, 5)
+        self.assertEqual(list(view), GOLDEN[2:5])
+        self.assertRaises(BufferError, moves.append, (0, 8, 1, True))
+        del view
+        moves.append((0, 8, 1, True))
+
+    def testBytes(self):
+        moves = MoveList.fromRecords(GOLDEN)
+        data = moves.tobytes()
+        self.assertEqual(len(data), 2*len(GOLDEN))
+        self.assertEqual(MoveList.frombytes(data), moves)
+        self.assertEqual(list(MoveList.frombytes(data, copy=False)), GOLDEN)
+
+class FuzzTest(unittest.TestCase):
+    def testRandomSolutions(self):
+        '''
+        Random moves, written as fc-solve writes them with and without the
+        boards, and read back in random chunks
+        '''
+        rng = random.Random(2)
+        board = read('synthetic-pt.txt').split('====================')[0]
+        for trial in range(200):
+            cellBase = rng.choice((8, 10))
+            moves = []
+            for k in range(rng.randrange(30)):
+                source = rng.randrange(cellBase+4)
+                target = rng.choice([-1, rng.randrange(cellBase+4)])
+                cards = 1 if source >= cellBase or target < 0 else rng.randrange(1, 14)
+                moves.append((source, target, cards, False))
+            lines = [moveLine(s, t, n, cellBase) for s, t, n, a in moves]
+            separator = '\n\n%s\n====================\n\n'%board if rng.random() < .5 else '\n\n====================\n\n'
+            text = separator.join(lines)
+            if rng.random() < .8:
+                text = '-=-=-=-=-=-=-=-=-=-=-=-\n\n'+text
+            if rng.random() < .5:
+                text += '\n\nThis game is solveable.\n'
+            self.assertEqual(feedChunks(text, rng, cellBase), moves)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# test_server.py Tests of the solver service, with a fake solver
+
+import asyncio, json, os, random, shutil, tempfile, time, unittest
+import server
+from model import formatBoard
+from solver import CANCELLED
+
+FAKE_SOLVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake-solver')
+CODES = ['%s%s'%(rank, suit) for rank in 'A23456789TJQK' for suit in 'SHDC']
+
+def board(seed):
+    codes = CODES[:]
+    random.Random(seed).shuffle(codes)
+    return formatBoard([codes[k::8] for k in range(8)])
+
+def decode(data):
+    '''
+    The status code, and the JSON objects in the body, of a reply
+    '''
+    head, _, body = data.partition(b'\r\n\r\n')
+    code = int(head.split()[1])
+    if b'chunked' in head:
+        text = b''
+        while True:
+            size, _, body = body.partition(b'\r\n')
+            size = int(size, 16)
+            if not size:
+                break
+            text += body[:size]
+            body = body[size+2:]
+    else:
+        text = body
+    return code, [json.loads(line) for line in text.decode().splitlines()]
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.log = os.path.join(self.dirname, 'calls')
+        self.environ = dict(os.environ)
+        os.environ['FAKE_SOLVER_LOG'] = self.log
+        os.environ['FAKE_SOLVER_DELAY'] = '.5'
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.dirname)
+
+    async def startService(self, command=FAKE_SOLVER, **kwargs):
+        self.service = service = server.SolveService(**kwargs)
+        service.pool.command = command
+        self.server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.addAsyncCleanup(self.stopService)
+
+    async def stopService(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.service.shutdown()
+
+    async def send(self, body, client=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        data = json.dumps(body).encode()
+        header = b'X-Client-Id: %s\r\n'%client.encode() if client else b''
+        writer.write(b'POST /solve HTTP/1.1\r\n' + header +
+                     b'Content-Length: %d\r\n\r\n'%len(data) + data)
+        await writer.drain()
+        return reader, writer
+
+    async def solve(self, body, client=None):
+        reader, writer = await self.send(body, client)
+        data = await reader.read()
+        writer.close()
+        return decode(data)
+
+    def calls(self):
+        try:
+            with open(self.log) as fin:
+                return len(fin.readlines())
+        except OSError:
+            return 0
+
+    async def testSolve(self):
+        await self.startService()
+        code, objects = await self.solve({'board':board(1)})
+        self.assertEqual(code, 200)
+        self.assertEqual(objects, [{'status':'solved'},
+                                   {'source':3, 'target':-1, 'cards':1},
+                                   {'source':1, 'target':5, 'cards':3},
+                                   {'source':10, 'target':4, 'cards':1},
+                                   {'moves':3}])
+
+    async def testSharedBoard(self):
+        await self.startService()
+        replies = await asyncio.gather(*[self.solve({'board':board(1)}, 'c%d'%k) for k in range(3)])
+        self.assertEqual([code for code, objects in replies], [200]*3)
+        self.assertEqual(replies[0], replies[1])
+        self.assertEqual(replies[0], replies[2])
+        self.assertEqual(self.calls(), 1)
+
+    async def testPerClientLimit(self):
+        await self.startService(perClient=2)
+        replies = await asyncio.gather(*[self.solve({'board':board(k)}, 'tool') for k in range(3)])
+        self.assertEqual(sorted(code for code, objects in replies), [200, 200, 429])
+        # requests without a client id are each a client of their own
+        replies = await asyncio.gather(*[self.solve({'board':board(k)}) for k in range(3)])
+        self.assertEqual([code for code, objects in replies], [200]*3)
+
+    async def testQueueFull(self):
+        await self.startService(maxQueue=2, perClient=10)
+        replies = await asyncio.gather(*[self.solve({'board':board(k)}, 'tool') for k in range(3)])
+        self.assertEqual(sorted(code for code, objects in replies), [200, 200, 503])
+        self.assertEqual(self.service.status()['queued'], 0)
+
+    async def testHangup(self):
+        os.environ['FAKE_SOLVER_DELAY'] = '30'
+        await self.startService()
+        jobs = []
+        submit = self.service.pool.submit
+        def capture(*args, **kwargs):
+            job = submit(*args, **kwargs)
+            jobs.append(job)
+            return job
+        self.service.pool.submit = capture
+        first = await self.send({'board':board(1)})
+        second = await self.send({'board':board(1)})
+        deadline = time.time()+5
+        while not jobs and time.time() < deadline:
+            await asyncio.sleep(.05)
+        # the job goes on while a client is still waiting
+        first[1].close()
+        await asyncio.sleep(.3)
+        self.assertIsNone(jobs[0].poll())
+        second[1].close()
+        while not jobs[0].poll() and time.time() < deadline:
+            await asyncio.sleep(.05)
+        self.assertEqual(jobs[0].poll(), CANCELLED)
+        self.assertEqual(self.service.status()['queued'], 0)
+        self.assertEqual(self.service.status()['clients'], {})
+
+    async def testSolverMissing(self):
+        await self.startService(command=os.path.join(self.dirname, 'no-such-solver'))
+        code, objects = await self.solve({'board':board(1)})
+        self.assertEqual(code, 200)
+        self.assertEqual(objects[0]['status'], 'error')
+        self.assertEqual(objects[-1], {'moves':0})
+
+    async def testBadRequest(self):
+        await self.startService()
+        code, objects = await self.solve({'board':'nonsense'})
+        self.assertEqual(code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+# test_solver.py Tests of the solver pool and of reading its results
+
+import os, unittest
+from model import solutionStatus
+from solver import SolverPool, DONE, ERROR, TIMEOUT, CANCELLED
+
+class SolutionStatusTest(unittest.TestCase):
+    def testStatus(self):
+        self.assertEqual(solutionStatus(DONE, 'Move a card from stack 3 to the foundations\n'), 'solved')
+        self.assertEqual(solutionStatus(DONE, 'I could not solve this game.\n'), 'unsolved')
+        self.assertEqual(solutionStatus(DONE, 'Iterations count exceeded.\n'), 'intractable')
+        self.assertEqual(solutionStatus(TIMEOUT, ''), 'intractable')
+        self.assertEqual(solutionStatus(ERROR, ''), 'error')
+        self.assertEqual(solutionStatus(CANCELLED, ''), 'error')
+
+    def testMissingSolver(self):
+        pool = SolverPool(command=os.path.join(os.path.dirname(__file__), 'no-such-solver'))
+        try:
+            job = pool.submit('board\n', 'freecell')
+            state = job.wait(10)
+            self.assertEqual(state, ERROR)
+            self.assertEqual(solutionStatus(state, job.text), 'error')
+        finally:
+            pool.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
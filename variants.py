@@ -0,0 +1,113 @@
+# variants.py Rules of freecell solitaire and related games, as data
+
+'''
+Each game is described by a Variant, and compiled into a Rules object of
+lookup tables, so that the code that checks moves indexes tables instead of
+testing which game is being played.
+
+Cards are numbered 0 to 51:  rank = card//4 + 1, and the suit is card%4 in the
+order spades, hearts, diamonds, clubs.  Piles are numbered as in the Model:
+first the tableau piles, then the free cells, then the four foundations.
+'''
+from collections import namedtuple
+
+# RANKNAMES is a list that maps a rank to a string.  It contains a
+# dummy element at index 0 so it can be indexed directly with the card
+# value.
+
+SUIT_NAMES = 'SHDC'
+RANK_NAMES = ' A23456789TJQK'
+
+# build rules for the tableau
+ALTERNATE = 'alternate'      # down in alternating colors
+SUIT = 'suit'                # down in suit
+# which cards may be played to an empty tableau pile
+ANY = 'any'
+KINGS = 'kings'
+# which cards are played to the foundations automatically
+SAFE = 'safe'                # when the cards of the other color that could go on it are up
+ALWAYS = 'always'            # whenever it is the next card
+# how many cards may be moved at once to a tableau pile
+STANDARD = 'standard'        # (1 + free cells) * 2**(empty tableau piles)
+CELLS = 'cells'              # 1 + free cells
+UNLIMITED = 'unlimited'
+
+Variant = namedtuple('Variant', 'title preset gameDir columns cells dealtCells '
+                                'build empty autoplay supermove'.split())
+
+FREECELL = 0
+FORECELL = 1
+BAKERS_GAME = 2
+SEAHAVEN_TOWERS = 3
+EIGHT_OFF = 4
+RELAXED_FREECELL = 5
+
+VARIANTS = [
+    Variant('Freecell Solitaire', 'freecell', 'freecell', 8, 4, 0, ALTERNATE, ANY, SAFE, STANDARD),
+    Variant('Forecell Solitaire', 'forecell', 'forecell', 8, 4, 0, ALTERNATE, KINGS, SAFE, CELLS),
+    Variant("Baker's Game", 'bakers_game', 'bakersGame', 8, 4, 0, SUIT, ANY, ALWAYS, STANDARD),
+    Variant('Seahaven Towers', 'seahaven_towers', 'seahavenTowers', 10, 4, 2, SUIT, KINGS, ALWAYS, CELLS),
+    Variant('Eight Off', 'eight_off', 'eightOff', 8, 8, 4, SUIT, KINGS, ALWAYS, CELLS),
+    Variant('Relaxed Freecell', 'relaxed_freecell', 'relaxedFreecell', 8, 4, 0, ALTERNATE, ANY, SAFE, UNLIMITED),
+]
+
+RANK = tuple(c//4 + 1 for c in range(52))
+SUIT_OF = tuple(c%4 for c in range(52))
+SUIT_COLOR = (1, 0, 0, 1)                   # hearts and diamonds are red
+COLOR = tuple(SUIT_COLOR[s] for s in SUIT_OF)
+
+class Rules:
+    '''
+    Lookup tables for a Variant:
+        follows[lower][upper]   can card lower be played on card upper in the tableau?
+        emptyOK[card]           can card be played to an empty tableau pile?
+        autoNeeds[card]         foundations that must hold rank-1 cards before card
+                                is played to its foundation automatically
+        supermove[f][t]         how many cards can be moved to a tableau pile when there
+                                are f free cells and t other empty tableau piles
+    '''
+    def __init__(self, variant):
+        self.variant = variant
+        self.title = variant.title
+        self.preset = variant.preset
+        self.gameDir = variant.gameDir
+        self.columns = variant.columns
+        self.cells = variant.cells
+        self.dealtCells = variant.dealtCells
+        self.cellBase = variant.columns
+        self.foundationBase = variant.columns + variant.cells
+        self.npiles = self.foundationBase + 4
+        self.nactions = self.foundationBase * self.npiles
+
+        if variant.build == SUIT:
+            legal = lambda lower, upper: SUIT_OF[lower] == SUIT_OF[upper]
+        else:
+            legal = lambda lower, upper: COLOR[lower] != COLOR[upper]
+        self.follows = tuple(bytes(RANK[lower] == RANK[upper]-1 and legal(lower, upper)
+                                   for upper in range(52)) for lower in range(52))
+
+        if variant.empty == KINGS:
+            self.emptyOK = bytes(RANK[c] == 13 for c in range(52))
+        else:
+            self.emptyOK = bytes([1]*52)
+
+        needs = []
+        for c in range(52):
+            if variant.autoplay == SAFE and RANK[c] > 2:
+                needs.append(tuple(k for k in range(4) if SUIT_COLOR[k] != COLOR[c]))
+            else:
+                needs.append(())
+        self.autoNeeds = tuple(needs)
+
+        table = []
+        for f in range(variant.cells+1):
+            if variant.supermove == STANDARD:
+                row = [(1+f)*2**t for t in range(variant.columns+1)]
+            elif variant.supermove == CELLS:
+                row = [1+f]*(variant.columns+1)
+            else:
+                row = [52]*(variant.columns+1)
+            table.append(tuple(row))
+        self.supermove = tuple(table)
+
+RULES = [Rules(v) for v in VARIANTS]
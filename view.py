@@ -12,6 +12,7 @@ except ImportError:
     import Tkinter as tk
     import tkMessageBox as messagebox
 from model import SUIT_NAMES, RANK_NAMES, ALLRANKS, SUIT_SYMBOLS, Card
+from variants import VARIANTS
 
 # Constants determining the size and layout of cards and stacks.  
 #CARDWIDTH = 75   Constants used with small deck
@@ -39,6 +40,9 @@ SELECT_CURSOR = 'hand2'
 
 SUIT_FONT=("Times", "48", "bold")
 
+HINT_DELAY = 1000     # milliseconds without a move before looking for a hint
+HINT_SHOWN = 2000     # milliseconds a hint stays on the board
+
 imageDict = {}   # hang on to images, or they may disappear!
 
 class ButtonBar(tk.Canvas):
@@ -46,12 +50,14 @@ class ButtonBar(tk.Canvas):
         tk.Canvas.__init__(self,parent, bg=BACKGROUND, bd=0, highlightthickness=0)
         self.configure(height=5*MARGIN,width=6*XSPACING2)
         width=int(self['width'])
-        self.makeButton(width//2-15*MARGIN, 'undo')
-        self.makeButton(width//2-7*MARGIN, 'redo')
-        self.makeButton(width//2+1*MARGIN, 'solve')
-        self.makeButton(width//2+9*MARGIN, 'restart')
+        self.makeButton(width//2-19*MARGIN, 'undo')
+        self.makeButton(width//2-11*MARGIN, 'redo')
+        self.makeButton(width//2-3*MARGIN, 'hint')
+        self.makeButton(width//2+5*MARGIN, 'solve')
+        self.makeButton(width//2+13*MARGIN, 'restart')
         self.place(in_=parent, relx=.5,y=0,anchor=tk.N)  
         self.itemconfigure('solve', state=tk.HIDDEN)
+        self.itemconfigure('hint', state=tk.HIDDEN)
 
     def makeButton(self, left, text):
         self.create_oval(left, MARGIN, left+6*MARGIN, 4*MARGIN, fill=BUTTON, outline=BUTTON, tag = text)
@@ -72,19 +78,57 @@ class View:
         if sys.platform == 'darwin':
             root.createcommand('tk::mac::ReopenApplication', root.deiconify)
         root.protocol('WM_DELETE_WINDOW', quit)
-        width = 5*MARGIN+8*XSPACING2
-        self.root.wm_geometry('%dx850-10+10'%width)
+        self.root.wm_geometry('%dx850-10+10'%self.windowWidth(8, 4))
+        self.menu = tk.Menu(root)         # parent constructs actual menu         
+        root.config(menu=self.menu)                 
+        canvas = self.canvas = tk.Canvas(root, bg=BACKGROUND, cursor=DEFAULT_CURSOR, 
+                                                             bd=0, highlightthickness=0, **kwargs)
+        canvas.pack(expand=tk.YES, fill=tk.Y)
+        self.canvasWidth = kwargs['width']
+        self.rules = None
+        self.hintPending = None       # id of the after callback waiting for a hint
+        self.hintStart = None         # id of the after callback that starts the search
+        self.hintClear = None         # id of the after callback that removes the hint
+
+        self.loadImages()
+        self.createCards()
+        canvas.tag_bind("card", '<ButtonPress-1>', self.onClick)
+        canvas.tag_bind("card", '<Double-Button-1>', self.onDoubleClick)
+        canvas.bind('<B1-Motion>', self.drag)
+        canvas.bind('<ButtonRelease-1>', self.onDrop)
+        self.layout()
+        
+        self.buttons = ButtonBar(canvas)
+        self.buttons.tag_bind('undo', '<ButtonPress-1>', self.undo)
+        self.buttons.tag_bind('redo', '<ButtonPress-1>', self.redo)
+        self.buttons.tag_bind('restart', '<ButtonPress-1>', self.restart)
+        self.buttons.tag_bind('solve', '<ButtonPress-1>', self.solve)
+        self.buttons.tag_bind('hint', '<ButtonPress-1>', self.hint)
+        
+    def windowWidth(self, columns, cells):
+        return 5*MARGIN + max(columns*XSPACING2, (cells+4)*XSPACING1+FILLER-MARGIN)
 
+    def layout(self):
+        '''
+        Place the piles for the game the model is playing.
+        Nothing changes unless the game has changed since the last layout.
+        '''
+        rules = self.model.rules
+        if rules is self.rules:
+            return
+        self.rules = rules
+        root = self.root
+        canvas = self.canvas
+        width = self.windowWidth(rules.columns, rules.cells)
         root.minsize(width=width, height=500)
         root.maxsize(width=width, height=2500)
-        self.menu = tk.Menu(root)         # parent constructs actual menu         
-        root.config(menu=self.menu)                 
+        canvas.configure(width=self.canvasWidth+width-self.windowWidth(8, 4))
         self.tableau = []           # NW corners of the tableau piles
         self.foundations = []   # NW corners of the foundation piles
         self.cells=[]                 #NW corners of the free cells
         x = 4*MARGIN
         y = 6* MARGIN
-        for k in range(4):
+        for k in range(rules.cells):
             self.cells.append((x, y))
             x += XSPACING1
         x += FILLER
@@ -93,42 +137,26 @@ class View:
             x += XSPACING1
         y += YSPACING
         x = 4*MARGIN
-        for k in range(8):
+        for k in range(rules.columns):
             self.tableau.append((x, y)) 
             x += XSPACING2 
         self.grabPiles = self.tableau+self.cells
         self.piles = self.grabPiles+self.foundations        
-        canvas = self.canvas = tk.Canvas(root, bg=BACKGROUND, cursor=DEFAULT_CURSOR, 
-                                                             bd=0, highlightthickness=0, **kwargs)
-        canvas.pack(expand=tk.YES, fill=tk.Y)
-        width = kwargs['width']
-        height = kwargs['height']
-
-        self.loadImages()
-        self.createCards()
-        canvas.tag_bind("card", '<ButtonPress-1>', self.onClick)
-        canvas.tag_bind("card", '<Double-Button-1>', self.onDoubleClick)
-        canvas.bind('<B1-Motion>', self.drag)
-        canvas.bind('<ButtonRelease-1>', self.onDrop)
 
+        canvas.delete('pile')
         for t in self.tableau:
             canvas.create_rectangle(t[0], t[1], t[0]+CARDWIDTH, t[1]+CARDHEIGHT, 
-                                                    fill=PILEFILL, outline=PILEFILL)    
+                                                    fill=PILEFILL, outline=PILEFILL, tag='pile')    
         for idx, f in enumerate(self.foundations):
             canvas.create_rectangle(f[0], f[1], f[0]+CARDWIDTH, f[1]+CARDHEIGHT, 
-                                                    fill=PILEFILL, outline=PILEFILL)
+                                                    fill=PILEFILL, outline=PILEFILL, tag='pile')
             canvas.create_text(f[0]+CARDWIDTH//2,f[1]+CARDHEIGHT//2, 
-                                            text=SUIT_SYMBOLS[idx], fill='khaki',font=SUIT_FONT)
+                                            text=SUIT_SYMBOLS[idx], fill='khaki',font=SUIT_FONT, tag='pile')
         for c in self.cells:
             canvas.create_rectangle(c[0], c[1], c[0]+CARDWIDTH, c[1]+CARDHEIGHT, 
-                                                    fill=PILEFILL, outline=PILEFILL)
-        
-        self.buttons = ButtonBar(canvas)
-        self.buttons.tag_bind('undo', '<ButtonPress-1>', self.undo)
-        self.buttons.tag_bind('redo', '<ButtonPress-1>', self.redo)
-        self.buttons.tag_bind('restart', '<ButtonPress-1>', self.restart)
-        self.buttons.tag_bind('solve', '<ButtonPress-1>', self.solve)
-        
+                                                    fill=PILEFILL, outline=PILEFILL, tag='pile')
+        canvas.tag_lower('pile')
+
     def start(self):
         self.show()
         self.root.mainloop()
@@ -178,11 +206,11 @@ class View:
         model = self.model
         canvas = self.canvas
         self.showTitle()
-        for k in range(8):
+        for k in range(len(self.tableau)):
             self.showTableau(k)
         for k in range(4):
             self.showFoundation(k)
-        for k in range(4):
+        for k in range(len(self.cells)):
             self.showCell(k)
         if model.canUndo():
             self.enableUndo()
@@ -194,6 +222,7 @@ class View:
             self.disableRedo()
         if len(model.tableau[0]) != 0:
             self.enableSolve()
+            self.enableHint()
 
     def dealUp(self):
         self.model.dealUp()
@@ -210,11 +239,8 @@ class View:
             canvas.tag_raise(tag)
             
     def showTitle(self):
-        titles = ['Freecell Solitaire',
-                       'Forecell Solitaire',
-                       "Baker's Game"] 
         game = self.parent.gameType.get()
-        self.root.title(titles[game])
+        self.root.title(VARIANTS[game].title)
 
     def grab(self, selection, k, mouseX, mouseY):
         '''
@@ -278,12 +304,13 @@ class View:
         if model.topToCell(k):
             self.show()
             self.automaticMoves()
+            self.positionChanged()
     
     def dropTargets(self):
         piles = self.piles
         heaps = self.model.piles
         targets = [[left, top, left+CARDWIDTH, top+CARDHEIGHT ] for left,top in piles]
-        for idx in range(8):
+        for idx in range(len(self.tableau)):
             cards = len(heaps)
             if cards > 1:
                 targets[idx][3]+= OFFSET * (cards-1)
@@ -303,7 +330,7 @@ class View:
         dragging = len(model.selection)
         if dragging > 1:
             south += OFFSET *(dragging-1)
-        for idx in range(16):
+        for idx in range(len(targets)):
             if idx == origin: continue
             left, top, right, bottom = targets[idx]
             horizontal = min(east, right) - max(west, left) 
@@ -349,25 +376,103 @@ class View:
         self.show()
         self.canvas.dtag('floating')
         self.automaticMoves()
+        self.positionChanged()
             
     def automaticMoves(self):
         while self.model.automaticMove():
             self.show()
             self.canvas.update()  # update_idletasks doesn't work on Mac
-            time.sleep(.06)
+            self.pause(.06)
         self.show()
 
+    def pause(self, seconds):
+        '''
+        Let the player see each automatic move
+        '''
+        time.sleep(seconds)
+
     def undo(self, event):
         self.model.undo()
         self.show()
+        self.positionChanged()
 
     def redo(self, event):
         self.model.redo()
         self.show()  
+        self.positionChanged()
 
     def restart(self, event):
         self.model.restart()
         self.show()
+        self.positionChanged()
+
+    def positionChanged(self):
+        '''
+        Forget any hint for the old position, and start looking for a hint
+        from the new one once the player has stopped moving for a moment,
+        so the search does not slow down play.
+        '''
+        self.clearHint()
+        if self.hintStart is not None:
+            self.root.after_cancel(self.hintStart)
+        self.hintStart = self.root.after(HINT_DELAY, self.requestHint)
+
+    def requestHint(self):
+        self.hintStart = None
+        self.model.requestHint()
+
+    def clearHint(self):
+        '''
+        Remove the hint shown, and stop waiting for one
+        '''
+        root = self.root
+        if self.hintPending is not None:
+            root.after_cancel(self.hintPending)
+            self.hintPending = None
+        if self.hintClear is not None:
+            root.after_cancel(self.hintClear)
+            self.hintClear = None
+        self.canvas.delete('hint')
+
+    def hint(self, event):
+        self.clearHint()
+        if self.hintStart is not None:
+            self.root.after_cancel(self.hintStart)
+            self.requestHint()
+        self.showHint()
+
+    def showHint(self):
+        '''
+        Outline the cards to move and where to move them.
+        If the search is still running, check again in a little while, so
+        the event loop is never blocked.
+        '''
+        model = self.model
+        canvas = self.canvas
+        answer = model.readHint()
+        if answer == 'running':
+            self.hintPending = self.root.after(100, self.showHint)
+            return
+        self.hintPending = None
+        if answer == 'none':
+            messagebox.showinfo('','No hint\nNo solution found from here',parent=self.canvas)
+            return
+        source, target, n = answer
+        boxes = [canvas.bbox('code%s'%card.code) for card in model.piles[source][-n:]]
+        dest = model.piles[target]
+        if dest:
+            boxes.append(canvas.bbox('code%s'%dest[-1].code))
+        else:
+            x, y = self.piles[target]
+            boxes.append((x, y, x+CARDWIDTH, y+CARDHEIGHT))
+        moving = boxes[:-1]
+        west = min(b[0] for b in moving)
+        north = min(b[1] for b in moving)
+        east = max(b[2] for b in moving)
+        south = max(b[3] for b in moving)
+        canvas.create_rectangle(west, north, east, south, outline=TEXT, width=3, tag='hint')
+        canvas.create_rectangle(*boxes[-1], outline=TEXT, width=3, dash=(6, 4), tag='hint')
+        self.hintClear = self.root.after(HINT_SHOWN, self.clearHint)
         
     def solve(self, event):
         model = self.model
@@ -376,6 +481,8 @@ class View:
             messagebox.showinfo('','Working On It\nTry again in a little while',parent=self.canvas)
         elif status == 'unsolved':
             messagebox.showinfo('','Unsolved\nNo solution',parent=self.canvas)
+        elif status == 'error':
+            messagebox.showerror('','Solver failed\nfc-solve could not be run',parent=self.canvas)
         elif status == 'intractable':
             if messagebox.askyesno('','Intractable\nSave game file?',parent=self.canvas):
                 model.saveGame()
@@ -386,6 +493,7 @@ class View:
             self.show()
             self.enableRedo()
             self.disableSolve()
+            self.positionChanged()
 
     def disableRedo(self):
         self.buttons.itemconfigure('redo', state=tk.HIDDEN)
@@ -404,6 +512,9 @@ class View:
     def enableSolve(self):
         self.buttons.itemconfigure('solve', state=tk.NORMAL)
         
+    def enableHint(self):
+        self.buttons.itemconfigure('hint', state=tk.NORMAL)
+
     def disableSolve(self):
         self.buttons.itemconfigure('solve', state=tk.HIDDEN)
 